@@ -24,8 +24,8 @@ const Clock = () => (
   </svg>
 );
 
-const AlertsPanel = ({ results }) => {
-  if (!results || !results.alerts || results.alerts.length === 0) {
+const AlertsPanel = ({ alerts }) => {
+  if (!alerts || alerts.length === 0) {
     return (
       <div className="bg-green-50 border border-green-200 rounded-lg p-4 mb-6">
         <div className="flex items-center">
@@ -36,9 +36,9 @@ const AlertsPanel = ({ results }) => {
     );
   }
 
-  const criticalAlerts = results.alerts.filter(alert => alert.level === 'critical');
-  const warningAlerts = results.alerts.filter(alert => alert.level === 'warning');
-  const infoAlerts = results.alerts.filter(alert => alert.level === 'info');
+  const criticalAlerts = alerts.filter(alert => alert.level === 'critical');
+  const warningAlerts = alerts.filter(alert => alert.level === 'warning');
+  const infoAlerts = alerts.filter(alert => alert.level === 'info');
 
   return (
     <div className="mb-6 space-y-3">
@@ -21,9 +21,23 @@ const debounce = (func, wait) => {
   };
 };
 
+// Apply opened/escalated/resolved alert transitions to the active alert list
+const applyAlertTransitions = (alerts, transitions) => {
+  const byId = new Map(alerts.map(alert => [alert.id, alert]));
+  transitions.forEach(transition => {
+    if (transition.state === 'resolved') {
+      byId.delete(transition.id);
+    } else {
+      byId.set(transition.id, transition);
+    }
+  });
+  return Array.from(byId.values());
+};
+
 export default function Dashboard() {
   const [latestResults, setLatestResults] = useState(null);
   const [history, setHistory] = useState([]);
+  const [activeAlerts, setActiveAlerts] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
   const [connectionStatus, setConnectionStatus] = useState('connecting');
 
@@ -34,9 +48,10 @@ export default function Dashboard() {
 
   const fetchInitialData = useCallback(async () => {
     try {
-      const [resultsRes, historyRes] = await Promise.all([
+      const [resultsRes, historyRes, alertsRes] = await Promise.all([
         fetch(`${API_BASE}/latest-results`),
-        fetch(`${API_BASE}/history`)
+        fetch(`${API_BASE}/history`),
+        fetch(`${API_BASE}/alerts`)
       ]);
 
       if (resultsRes.ok) {
@@ -49,6 +64,11 @@ export default function Dashboard() {
         setHistory(historyData);
       }
 
+      if (alertsRes.ok) {
+        const alertsData = await alertsRes.json();
+        setActiveAlerts(alertsData);
+      }
+
       setConnectionStatus('connected');
     } catch (error) {
       console.error('Failed to fetch initial data:', error);
@@ -58,6 +78,18 @@ export default function Dashboard() {
     }
   }, []);
 
+  // Transitions missed while the stream was down are only visible in the full list
+  const fetchActiveAlerts = useCallback(async () => {
+    try {
+      const response = await fetch(`${API_BASE}/alerts`);
+      if (response.ok) {
+        setActiveAlerts(await response.json());
+      }
+    } catch (error) {
+      console.error('Failed to fetch active alerts:', error);
+    }
+  }, []);
+
   const setupSSEConnection = useCallback(() => {
     try {
       console.log('Setting up SSE connection...');
@@ -66,6 +98,7 @@ export default function Dashboard() {
       eventSource.onopen = () => {
         console.log('SSE connection established');
         setConnectionStatus('connected');
+        fetchActiveAlerts();
       };
   
       eventSource.onmessage = (event) => {
@@ -78,6 +111,9 @@ export default function Dashboard() {
           if (data.type === 'new_processing') {
             setLatestResults(prev => ({ ...data.data }));
             setHistory(prev => [...prev.slice(-99), data.data]);
+            if (data.data.alerts && data.data.alerts.length > 0) {
+              setActiveAlerts(prev => applyAlertTransitions(prev, data.data.alerts));
+            }
           }
         } catch (error) {
           console.error('Error parsing SSE data:', error);
@@ -107,7 +143,7 @@ export default function Dashboard() {
       // Retry after delay
       setTimeout(setupSSEConnection, 5000);
     }
-  }, []);
+  }, [fetchActiveAlerts]);
 
   const checkHealth = useCallback(debounce(async () => {
     try {
@@ -162,7 +198,7 @@ export default function Dashboard() {
       </header>
 
       <main className="max-w-7xl mx-auto px-4 sm:px-6 lg:px-8 py-6">
-        <AlertsPanel results={latestResults} />
+        <AlertsPanel alerts={activeAlerts} />
 
         <div className="grid grid-cols-1 lg:grid-cols-2 gap-6 mb-6">
           <div className="bg-white rounded-lg shadow p-4">
@@ -0,0 +1,117 @@
+"""Stateful alert tracking with confirmation, hysteresis and escalation.
+
+generate_alerts() in edge.py describes what a single frame shows. The
+AlertEngine turns that per-frame view into alert lifecycles keyed by
+(type, item, zone) and reports only the transitions:
+
+  * opened    - the condition was seen in at least confirm_n of the last
+                confirm_m cycles
+  * escalated - a perishable alert stayed open for escalation_seconds and
+                was raised to critical
+  * resolved  - the condition was absent for clear_cycles consecutive cycles
+
+A single noisy frame therefore neither opens nor clears an alert, and an
+ongoing condition is reported once instead of on every cycle.
+"""
+from collections import deque
+import datetime
+import threading
+import uuid
+
+class AlertTrack:
+    """Recent observations and the open alert (if any) for one key"""
+    def __init__(self, window):
+        self.seen = deque(maxlen=window)
+        self.absent_cycles = 0
+        self.alert = None
+
+class AlertEngine:
+    def __init__(self, confirm_n=2, confirm_m=3, clear_cycles=3, escalation_seconds=300):
+        if not 1 <= confirm_n <= confirm_m:
+            raise ValueError("confirm_n must be between 1 and confirm_m")
+        self.confirm_n = confirm_n
+        self.confirm_m = confirm_m
+        self.clear_cycles = clear_cycles
+        self.escalation_seconds = escalation_seconds
+        self.tracks = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def alert_key(alert):
+        return (alert['type'], alert['item'], alert.get('zone'))
+
+    def update(self, observed, now):
+        """Fold one cycle's observed alerts in, returns the transitions it caused.
+
+        observed is a list of alert dicts with at least type, item, level and
+        message (and optionally zone and perishable); now is the cycle's
+        datetime.
+        """
+        observed_by_key = {self.alert_key(alert): alert for alert in observed}
+        transitions = []
+
+        with self.lock:
+            for key in set(self.tracks) | set(observed_by_key):
+                track = self.tracks.get(key)
+                if track is None:
+                    track = self.tracks[key] = AlertTrack(self.confirm_m)
+
+                observation = observed_by_key.get(key)
+                track.seen.append(observation is not None)
+                track.absent_cycles = 0 if observation is not None else track.absent_cycles + 1
+
+                if track.alert is None:
+                    if sum(track.seen) >= self.confirm_n:
+                        track.alert = self.open_alert(observation, now)
+                        transitions.append(self.transition(track.alert, 'opened', now))
+                    elif not any(track.seen):
+                        # Nothing seen inside the window, forget the key
+                        del self.tracks[key]
+                    continue
+
+                if track.absent_cycles >= self.clear_cycles:
+                    transitions.append(self.transition(track.alert, 'resolved', now))
+                    del self.tracks[key]
+                    continue
+
+                if observation is not None:
+                    # Keep counts in the message current without a new transition
+                    track.alert['message'] = observation['message']
+                    track.alert['last_seen'] = now.isoformat()
+
+                if self.should_escalate(track.alert, now):
+                    track.alert['level'] = 'critical'
+                    track.alert['escalated_at'] = now.isoformat()
+                    transitions.append(self.transition(track.alert, 'escalated', now))
+
+        return transitions
+
+    def open_alert(self, observation, now):
+        alert = dict(observation)
+        alert['id'] = uuid.uuid4().hex[:12]
+        alert['opened_at'] = now.isoformat()
+        alert['last_seen'] = now.isoformat()
+        return alert
+
+    def should_escalate(self, alert, now):
+        if not alert.get('perishable') or alert['level'] == 'critical':
+            return False
+        opened_at = datetime.datetime.fromisoformat(alert['opened_at'])
+        return (now - opened_at).total_seconds() >= self.escalation_seconds
+
+    def transition(self, alert, state, now):
+        event = dict(alert)
+        event['state'] = state
+        event['changed_at'] = now.isoformat()
+        if state == 'resolved':
+            event['level'] = 'info'
+            event['message'] = f"RESOLVED: {alert['message']}"
+            opened_at = datetime.datetime.fromisoformat(alert['opened_at'])
+            event['duration_seconds'] = (now - opened_at).total_seconds()
+        return event
+
+    def active_alerts(self):
+        """Currently open alerts, oldest first"""
+        with self.lock:
+            alerts = [dict(track.alert) for track in self.tracks.values() if track.alert is not None]
+        return sorted(alerts, key=lambda alert: alert['opened_at'])
@@ -2,6 +2,7 @@ from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import requests
 import os
+import sys
 from requests.exceptions import RequestException
 from PIL import Image, ImageDraw, ImageColor
 from shapely.geometry import Polygon
@@ -14,12 +15,19 @@ from io import BytesIO
 import time
 import numpy as np
 import queue  # Import at the top level
+import uuid
+from collections import deque, OrderedDict
 import cv2
 
+import rollups
+import history_export
+from alert_engine import AlertEngine
+
 app = Flask(__name__)
 CORS(app)
-PROCESS_INTERVAL = 60  # Process every 60 seconds
-DETECTOR_MODULE_URL = "http://172.18.0.4/image"
+# Environment overrides let simulations/loadtest.py point the server at stubs
+PROCESS_INTERVAL = float(os.environ.get("PROCESS_INTERVAL", 60))  # Process every 60 seconds
+DETECTOR_MODULE_URL = os.environ.get("DETECTOR_MODULE_URL", "http://172.18.0.4/image")
 
 # Use a thread-safe queue for SSE clients
 client_queues = []
@@ -45,10 +53,37 @@ EXPECTED_INVENTORY = {
 
 PERISHABLE_ITEMS = ['tea bottle']
 
+# Alert lifecycle: open after N of the last M cycles show a condition, resolve
+# after it is absent for ALERT_CLEAR_CYCLES in a row, and raise open
+# perishable alerts to critical after PERISHABLE_ESCALATION_SECONDS
+ALERT_CONFIRM_N = 2
+ALERT_CONFIRM_M = 3
+ALERT_CLEAR_CYCLES = 3
+PERISHABLE_ESCALATION_SECONDS = 300
+
+alert_engine = AlertEngine(
+    confirm_n=ALERT_CONFIRM_N,
+    confirm_m=ALERT_CONFIRM_M,
+    clear_cycles=ALERT_CLEAR_CYCLES,
+    escalation_seconds=PERISHABLE_ESCALATION_SECONDS
+)
+
 latest_results = None
 latest_annotated_image = None
 processing_active = False
 
+# On-demand processing: triggered jobs run on a priority lane ahead of the
+# scheduled cycle, and concurrent triggers for a camera share one job
+TRIGGER_WAIT_MAX = 30  # Longest a caller may block waiting for a result (seconds)
+JOB_HISTORY_SIZE = 100  # Finished jobs kept for polling
+
+jobs_lock = threading.Lock()
+priority_jobs = deque()  # Triggered jobs waiting to run
+queued_jobs = {}  # camera id -> triggered job not yet started
+running_jobs = {}  # camera id -> job currently running
+recent_jobs = OrderedDict()  # job id -> job, oldest first
+processing_wakeup = threading.Event()
+
 def setup_directories():
     """Create necessary directories for image storage"""
     directories = ['captured_images', 'processed_images', 'annotated_images', 'logs', 'dashboard_data']
@@ -112,10 +147,45 @@ def create_fallback_image():
     except:
         return b''
 
-MAC_CAMERA_URL = "http://localhost:9999/snapshot"  # This assumes SSH tunnel is set up
+MAC_CAMERA_URL = os.environ.get("MAC_CAMERA_URL", "http://localhost:9999/snapshot")  # This assumes SSH tunnel is set up
+CAMERA_ID = "mac"  # Identifies this camera in logs, jobs and queries
+
+# "simulator" replaces the Mac camera and the detector with synthetic shelf
+# scenes from simulations/shelf_scene.py, configured by SIMULATOR_CONFIG
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE", "mac")
+SIMULATOR_CONFIG = os.environ.get("SIMULATOR_CONFIG")  # Optional JSON file of ShelfScene arguments
+SIMULATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'simulations')
+
+simulated_scene = None
+simulator_lock = threading.Lock()
+
+def get_simulated_scene():
+    """Create the shelf scene simulator on first use"""
+    global simulated_scene
+    with simulator_lock:
+        if simulated_scene is None:
+            if SIMULATIONS_DIR not in sys.path:
+                sys.path.append(SIMULATIONS_DIR)
+            from shelf_scene import ShelfScene
+            if SIMULATOR_CONFIG:
+                simulated_scene = ShelfScene.from_file(SIMULATOR_CONFIG)
+            else:
+                simulated_scene = ShelfScene(zones=EXPECTED_SHELF_ZONES, counts=EXPECTED_INVENTORY)
+            print(f"Scene simulator enabled ({simulated_scene.width}x{simulated_scene.height})")
+        return simulated_scene
+
+def capture_simulated_image():
+    """Render a simulated frame, carrying its ground-truth detector response"""
+    frame = get_simulated_scene().render()
+    image_data = BytesIO(frame.jpeg)
+    image_data.simulated_detection = frame.detector_response
+    return image_data
 
 def get_camera_image():
     """Get image from Mac camera via SSH tunnel, fallback to test image"""
+    if CAMERA_SOURCE == "simulator":
+        return get_simulated_scene().render().jpeg
+    
     try:
         print(f"Requesting image from Mac camera: {MAC_CAMERA_URL}")
         response = requests.get(MAC_CAMERA_URL, timeout=3)
@@ -136,6 +206,9 @@ def get_camera_image():
 
 def capture_image_from_mac():
     """Capture image from Mac camera for processing"""
+    if CAMERA_SOURCE == "simulator":
+        return capture_simulated_image()
+    
     try:
         response = requests.get(MAC_CAMERA_URL, timeout=3)
         if response.status_code == 200:
@@ -186,10 +259,11 @@ def test_mac_camera():
             'url': MAC_CAMERA_URL
         })
         
-def generate_detailed_log(results, image_path):
-    """Generate comprehensive log entry"""
+def generate_detailed_log(results, image_path, camera=CAMERA_ID, alerts=None):
+    """Generate comprehensive log entry, alerts being the cycle's alert transitions"""
     log_entry = {
         "timestamp": results['timestamp'],
+        "camera_id": camera,
         "image_path": image_path,
         "annotated_image_path": results.get('annotated_image_path'),
         "summary": {
@@ -216,50 +290,63 @@ def generate_detailed_log(results, image_path):
                 "confidence": float(item.probability * 100)
             } for item in results['correctly_placed']
         ],
-        "alerts": generate_alerts(results)
+        # Only alert transitions (opened/escalated/resolved) are logged and pushed
+        "alerts": alerts or []
     }
     return log_entry
 
 def generate_alerts(results):
-    """Generate alert messages based on results"""
+    """Describe the alert conditions visible in a single frame.
+    
+    These are observations, not notifications: alert_engine decides when a
+    condition opens, escalates or resolves an alert.
+    """
     alerts = []
     
-    if results['misplaced']:
-        for item in results['misplaced']:
-            alert = {
-                "level": "critical" if item.tag_name in PERISHABLE_ITEMS else "warning",
-                "message": f"MISPLACED: {item.tag_name} is out of position",
-                "type": "misplacement"
-            }
-            alerts.append(alert)
-    
-    if results['missing']:
-        for item_type, count in results['missing'].items():
-            alert = {
-                "level": "critical" if item_type in PERISHABLE_ITEMS else "warning",
-                "message": f"MISSING: {count} {item_type}(s) not found",
-                "type": "stockout"
-            }
-            alerts.append(alert)
-    
-    if results['extra']:
-        for item_type, count in results['extra'].items():
-            alert = {
-                "level": "info",
-                "message": f"EXTRA: {count} unexpected {item_type}(s) detected",
-                "type": "overstock"
-            }
-            alerts.append(alert)
+    # One alert per item type and the zone it was found in
+    misplaced_counts = {}
+    for item in results['misplaced']:
+        key = (item.tag_name, locate_zone(item, EXPECTED_SHELF_ZONES))
+        misplaced_counts[key] = misplaced_counts.get(key, 0) + 1
+    
+    for (item_type, zone), count in misplaced_counts.items():
+        location = f"in {zone} zone" if zone else "outside all zones"
+        alerts.append({
+            "level": "warning",
+            "message": f"MISPLACED: {count} {item_type}(s) out of position, {location}",
+            "type": "misplacement",
+            "item": item_type,
+            "zone": zone,
+            "perishable": item_type in PERISHABLE_ITEMS
+        })
+    
+    for item_type, count in results['missing'].items():
+        alerts.append({
+            "level": "warning",
+            "message": f"MISSING: {count} {item_type}(s) not found",
+            "type": "stockout",
+            "item": item_type,
+            "zone": None,
+            "perishable": item_type in PERISHABLE_ITEMS
+        })
+    
+    for item_type, count in results['extra'].items():
+        alerts.append({
+            "level": "info",
+            "message": f"EXTRA: {count} unexpected {item_type}(s) detected",
+            "type": "overstock",
+            "item": item_type,
+            "zone": None,
+            "perishable": False
+        })
     
     return alerts
 
 def save_detailed_log(log_entry):
     """Save detailed log to file and dashboard data"""
     try:
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        
         # Save to logs directory
-        log_filename = f"logs/stock_check_{timestamp}.json"
+        log_filename = f"logs/stock_check_{cycle_name(log_entry.get('image_path'))}.json"
         with open(log_filename, 'w') as f:
             json.dump(log_entry, f, indent=2)
         
@@ -281,6 +368,9 @@ def save_detailed_log(log_entry):
         with open(dashboard_file, 'w') as f:
             json.dump(history, f, indent=2)
         
+        # Full history for exports, one NDJSON file per day
+        history_export.append_to_journal(log_entry)
+        
         print(f"Detailed log saved: {log_filename}")
         
     except Exception as e:
@@ -296,93 +386,256 @@ def notify_clients(data):
             # Remove broken clients
             client_queues.remove(client_queue)
 
-def periodic_processing():
-    """Periodically process images from Mac camera"""
+def cycle_name(image_path=None):
+    """File name stem shared by a cycle's images and logs, taken from its original image"""
+    name = os.path.basename(image_path or '')
+    if name.endswith('_original.jpg'):
+        return name[:-len('_original.jpg')]
+    # Microseconds, since triggered cycles can run within the same second
+    return datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+
+def save_original_image(image_data):
+    """Save the captured image to disk and return its path"""
+    original_filename = f"captured_images/{cycle_name()}_original.jpg"
+    with open(original_filename, 'wb') as f:
+        f.write(image_data.getvalue())
+    return original_filename
+
+def handle_detection_results(image_data, detection_results, original_filename, camera=CAMERA_ID):
+    """Analyse detector output, persist logs and update the latest results"""
     global latest_results, latest_annotated_image
     
+    results = process_detection_with_analysis(image_data, detection_results, original_filename)
+    latest_results = results
+    
+    # Only alert transitions (opened/escalated/resolved) are logged and pushed
+    alerts = alert_engine.update(generate_alerts(results), datetime.datetime.fromisoformat(results['timestamp']))
+    
+    # Generate detailed log
+    log_entry = generate_detailed_log(results, original_filename, camera, alerts)
+    save_detailed_log(log_entry)
+    rollups.record_cycle(log_entry, max_gap=2 * PROCESS_INTERVAL)
+    
+    # Store annotated image for web display
+    if 'annotated_image_path' in results and results['annotated_image_path'] and os.path.exists(results['annotated_image_path']):
+        with open(results['annotated_image_path'], 'rb') as f:
+            latest_annotated_image = f.read()
+    
+    return log_entry
+
+class ProcessingJob:
+    """A single processing cycle, either scheduled or triggered on demand"""
+    def __init__(self, camera, source):
+        self.id = uuid.uuid4().hex[:12]
+        self.camera = camera
+        self.source = source
+        self.status = 'queued'
+        self.requested_at = datetime.datetime.now().isoformat()
+        self.started_at = None
+        self.completed_at = None
+        self.coalesced_requests = 0
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self._callbacks = []
+    
+    def add_done_callback(self, callback):
+        """Call callback(job) once the job finishes, immediately if it already has"""
+        with jobs_lock:
+            if not self.done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+    
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'camera_id': self.camera,
+            'source': self.source,
+            'status': self.status,
+            'requested_at': self.requested_at,
+            'started_at': self.started_at,
+            'completed_at': self.completed_at,
+            'coalesced_requests': self.coalesced_requests,
+            'error': self.error,
+            'result': self.result
+        }
+
+def remember_job(job):
+    """Keep a job available for polling, dropping the oldest ones"""
+    recent_jobs[job.id] = job
+    while len(recent_jobs) > JOB_HISTORY_SIZE:
+        recent_jobs.popitem(last=False)
+
+def request_processing(camera=CAMERA_ID):
+    """Queue an immediate processing cycle, returns (job, coalesced)"""
+    with jobs_lock:
+        job = queued_jobs.get(camera)
+        if job is not None:
+            # A cycle for this camera has not started yet, share it. A running
+            # cycle may have captured its image before the trigger, so those
+            # get one follow-up job instead.
+            job.coalesced_requests += 1
+            return job, True
+        
+        job = ProcessingJob(camera, 'trigger')
+        queued_jobs[camera] = job
+        priority_jobs.append(job)
+        remember_job(job)
+    
+    processing_wakeup.set()
+    print(f"Processing triggered for {camera}, job {job.id}")
+    return job, False
+
+def get_job(job_id):
+    with jobs_lock:
+        return recent_jobs.get(job_id)
+
+def claim_processing_job(next_scheduled):
+    """Return the next job to run without blocking, or None if nothing is due"""
+    with jobs_lock:
+        if priority_jobs:
+            job = priority_jobs.popleft()
+            if queued_jobs.get(job.camera) is job:
+                del queued_jobs[job.camera]
+        elif time.time() >= next_scheduled and CAMERA_ID not in running_jobs:
+            job = ProcessingJob(CAMERA_ID, 'scheduled')
+            remember_job(job)
+        else:
+            return None
+        
+        running_jobs[job.camera] = job
+        job.status = 'running'
+        job.started_at = datetime.datetime.now().isoformat()
+        return job
+
+def wait_for_processing_job(next_scheduled):
+    """Block until a triggered job arrives or the scheduled cycle is due"""
+    while processing_active:
+        job = claim_processing_job(next_scheduled)
+        if job is not None:
+            return job
+        
+        processing_wakeup.wait(max(0, next_scheduled - time.time()))
+        processing_wakeup.clear()
+    return None
+
+def finish_job(job, log_entry, error=None):
+    """Record the outcome of a job and release everyone waiting on it"""
+    with jobs_lock:
+        job.status = 'completed' if log_entry is not None else 'failed'
+        job.completed_at = datetime.datetime.now().isoformat()
+        job.result = log_entry
+        job.error = error
+        if running_jobs.get(job.camera) is job:
+            del running_jobs[job.camera]
+        callbacks, job._callbacks = job._callbacks, []
+        job.done.set()
+    
+    for callback in callbacks:
+        callback(job)
+
+def run_processing_cycle(camera=CAMERA_ID):
+    """Capture, detect and analyse one image, returns the log entry or None"""
+    # Capture image from Mac
+    image_data = capture_image_from_mac()
+    if not image_data:
+        print("Failed to capture image from Mac")
+        return None
+    
+    # Save original image
+    original_filename = save_original_image(image_data)
+    
+    # Process with detector
+    detection_results = detect_objects_local(image_data)
+    
+    if not detection_results:
+        print("❌ Detection failed")
+        return None
+    
+    log_entry = handle_detection_results(image_data, detection_results, original_filename, camera)
+    
+    # Notify dashboard clients
+    notify_clients(json.dumps({
+        "type": "new_processing",
+        "data": log_entry
+    }))
+    
+    print("✓ Processing completed successfully")
+    return log_entry
+
+def periodic_processing():
+    """Process images from Mac camera on schedule and on demand"""
+    next_scheduled = time.time()
+    
     while processing_active:
+        job = wait_for_processing_job(next_scheduled)
+        if job is None:
+            continue
+        
         try:
-            print(f"\n=== Processing cycle started ===")
-            
-            # Capture image from Mac
-            image_data = capture_image_from_mac()
-            if not image_data:
-                print("Failed to capture image from Mac")
-                time.sleep(PROCESS_INTERVAL)
-                continue
-            
-            # Save original image
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            original_filename = f"captured_images/{timestamp}_original.jpg"
-            with open(original_filename, 'wb') as f:
-                f.write(image_data.getvalue())
-            
-            # Process with detector
-            detection_results = detect_objects_local(image_data)
-            
-            if detection_results:
-                results = process_detection_with_analysis(image_data, detection_results, original_filename)
-                latest_results = results
-                
-                # Generate detailed log
-                log_entry = generate_detailed_log(results, original_filename)
-                save_detailed_log(log_entry)
-                
-                # Store annotated image for web display
-                if 'annotated_image_path' in results and os.path.exists(results['annotated_image_path']):
-                    with open(results['annotated_image_path'], 'rb') as f:
-                        latest_annotated_image = f.read()
-                
-                # Notify dashboard clients
-                notify_clients(json.dumps({
-                    "type": "new_processing",
-                    "data": log_entry
-                }))
-                
-                print("✓ Processing completed successfully")
-            else:
-                print("❌ Detection failed")
-                
+            print(f"\n=== Processing cycle started ({job.source}, job {job.id}) ===")
+            log_entry = run_processing_cycle(job.camera)
+            finish_job(job, log_entry, None if log_entry is not None else 'Detection failed')
         except Exception as e:
             print(f"❌ Error in processing cycle: {e}")
+            finish_job(job, None, str(e))
+        
+        # Any completed cycle, triggered or not, restarts the schedule
+        next_scheduled = time.time() + PROCESS_INTERVAL
+
+def get_simulated_detection(image_data):
+    """Ground-truth detections carried by a simulator frame, None for camera images"""
+    simulated_detection = getattr(image_data, 'simulated_detection', None)
+    if simulated_detection is not None:
+        print(f"Using simulated detections: {len(simulated_detection['predictions'])} items")
+    return simulated_detection
+
+def detector_payload(image_data):
+    """Image bytes to send to the detector module"""
+    # Reset the stream position
+    image_data.seek(0)
+    image_bytes = image_data.read()
+    
+    print(f"Sending image to detector: {DETECTOR_MODULE_URL}")
+    print(f"Image size: {len(image_bytes)} bytes")
+    return image_bytes
+
+def read_detector_response(response):
+    """Detection results from the detector module's HTTP response, None on error"""
+    print(f"Detector response status: {response.status_code}")
+    
+    if response.status_code == 200:
+        result = response.json()
+        print("✓ Detector processed image successfully")
         
-        time.sleep(PROCESS_INTERVAL)
+        # Debug: Show what the detector found
+        if 'predictions' in result:
+            print(f"Raw predictions: {len(result['predictions'])} items")
+            for i, pred in enumerate(result['predictions'][:5]):  # Show first 5
+                print(f"  {i}: {pred['tagName']} - {pred['probability']:.6f}")
+        
+        return result
+    else:
+        print(f"Error from detector: {response.status_code}")
+        print(f"Response text: {response.text[:200]}...")
+        return None
 
 def detect_objects_local(image_data):
     """Send image to local IoT Edge detector module"""
+    simulated_detection = get_simulated_detection(image_data)
+    if simulated_detection is not None:
+        return simulated_detection
+    
     try:
-        # Reset the stream position
-        image_data.seek(0)
-        image_bytes = image_data.read()
-        
-        print(f"Sending image to detector: {DETECTOR_MODULE_URL}")
-        print(f"Image size: {len(image_bytes)} bytes")
-        
         # Send to local detector module
         response = requests.post(
             DETECTOR_MODULE_URL,
             headers={'Content-Type': 'image/jpeg'},
-            data=image_bytes,
+            data=detector_payload(image_data),
             timeout=30
         )
-        
-        print(f"Detector response status: {response.status_code}")
-        
-        if response.status_code == 200:
-            result = response.json()
-            print("✓ Detector processed image successfully")
-            
-            # Debug: Show what the detector found
-            if 'predictions' in result:
-                print(f"Raw predictions: {len(result['predictions'])} items")
-                for i, pred in enumerate(result['predictions'][:5]):  # Show first 5
-                    print(f"  {i}: {pred['tagName']} - {pred['probability']:.6f}")
-            
-            return result
-        else:
-            print(f"Error from detector: {response.status_code}")
-            print(f"Response text: {response.text[:200]}...")
-            return None
+        return read_detector_response(response)
             
     except Exception as e:
         print(f"Error communicating with detector module: {e}")
@@ -454,6 +707,19 @@ def is_in_correct_zone(prediction, expected_zones):
     
     return False
 
+def locate_zone(prediction, expected_zones):
+    """Return the item type whose zone overlaps the prediction most, or None"""
+    item_polygon = create_polygon(prediction)
+    best_zone, best_overlap = None, 0
+    
+    for item_type, zones in expected_zones.items():
+        for zone in zones:
+            overlap = item_polygon.intersection(create_zone_polygon(zone)).area
+            if overlap > best_overlap:
+                best_zone, best_overlap = item_type, overlap
+    
+    return best_zone
+
 def process_detection_with_analysis(image_data, detection_results, original_path):
     """Process detection results and perform analysis"""
     threshold = 0.5  # Lower threshold to 0.1
@@ -575,8 +841,7 @@ def save_annotated_image(image_data, results, original_path):
                 draw.text((left, top - 30), label, fill=color)
 
             # Generate annotated image filename
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            annotated_filename = f"annotated_images/{timestamp}_annotated.jpg"
+            annotated_filename = f"annotated_images/{cycle_name(original_path)}_annotated.jpg"
             im.save(annotated_filename)
             print(f"Annotated image saved as: {annotated_filename}")
             
@@ -589,8 +854,7 @@ def save_annotated_image(image_data, results, original_path):
 def save_results_log(results, image_path):
     """Save analysis results to log file"""
     try:
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_filename = f"logs/stock_check_{timestamp}.log"
+        log_filename = f"logs/stock_check_{cycle_name(image_path)}.log"
         
         with open(log_filename, 'w') as log_file:
             log_file.write(f"Stock Analysis Report\n")
@@ -640,11 +904,11 @@ def health_check():
         'timestamp': datetime.datetime.now().isoformat()
     })
 
-@app.route('/api/latest-results')
-def get_latest_results():
+def latest_results_summary():
+    """Body of /api/latest-results"""
     if latest_results:
         # Simplified response for now
-        return jsonify({
+        return {
             'status': 'success',
             'timestamp': latest_results.get('timestamp', datetime.datetime.now().isoformat()),
             'summary': {
@@ -653,8 +917,12 @@ def get_latest_results():
                 'correctly_placed': len(latest_results.get('correctly_placed', [])),
                 'misplaced': len(latest_results.get('misplaced', []))
             }
-        })
-    return jsonify({'status': 'no_results'})
+        }
+    return {'status': 'no_results'}
+
+@app.route('/api/latest-results')
+def get_latest_results():
+    return jsonify(latest_results_summary())
 
 @app.route('/api/history')
 def get_history():
@@ -665,6 +933,32 @@ def get_history():
     except:
         return jsonify([])
 
+@app.route('/api/export')
+def export_history():
+    """Stream history or per-item detections, see history_export.parse_export_args"""
+    try:
+        query = history_export.parse_export_args(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    
+    mimetype, headers = history_export.export_headers(query)
+    chunks = history_export.export_chunks(default_camera=CAMERA_ID, **query)
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+@app.route('/api/alerts')
+def get_active_alerts():
+    """Currently open alerts; the SSE stream only carries their transitions"""
+    return jsonify(alert_engine.active_alerts())
+
+@app.route('/api/rollups')
+def get_rollups():
+    """Aggregated trends, see rollups.parse_query_args for parameters"""
+    try:
+        query = rollups.parse_query_args(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    return jsonify(rollups.query_rollups(**query))
+
 @app.route('/api/events')
 def sse_events():
     """Server-Sent Events endpoint for real-time updates"""
@@ -716,13 +1010,73 @@ def get_annotated_image():
         return Response(latest_annotated_image, mimetype='image/jpeg')
     return "No image", 404
 
-@app.route('/api/trigger-processing')
+def parse_trigger_wait(value):
+    """Parse the ?wait= seconds of a trigger request, clamped to TRIGGER_WAIT_MAX"""
+    wait = float(value or 0)
+    if not wait >= 0:  # Also rejects NaN
+        raise ValueError("wait must be a non-negative number")
+    return min(wait, TRIGGER_WAIT_MAX)
+
+def check_trigger_request(args):
+    """Validate trigger query parameters.
+
+    Returns (camera, wait, error), where error is None or the
+    (body, status_code) to answer with instead of queueing a job.
+    """
+    camera = args.get('camera', CAMERA_ID)
+    if camera != CAMERA_ID:
+        return camera, 0, ({'status': 'error', 'error': f'Unknown camera: {camera}'}, 404)
+    
+    try:
+        wait = parse_trigger_wait(args.get('wait'))
+    except ValueError:
+        return camera, 0, ({'status': 'error', 'error': 'wait must be a non-negative number of seconds'}, 400)
+    
+    if not processing_active:
+        return camera, wait, ({'status': 'error', 'error': 'Processing is not active'}, 503)
+    return camera, wait, None
+
+def trigger_response(job, coalesced):
+    """Build the trigger response body and status code for a job"""
+    body = job.to_dict()
+    body['coalesced'] = coalesced
+    body['poll_url'] = f"/api/jobs/{job.id}"
+    if job.done.is_set():
+        body['message'] = f"Processing {job.status}"
+        return body, 200
+    body['message'] = 'Processing queued' if job.status == 'queued' else 'Processing in progress'
+    return body, 202
+
+@app.route('/api/trigger-processing', methods=['GET', 'POST'])
 def trigger_processing():
-    """Manually trigger processing"""
-    return jsonify({'message': 'Processing will occur on next scheduled interval'})
+    """Trigger an immediate processing cycle.
+
+    Optional query parameters: camera (defaults to CAMERA_ID) and wait,
+    the number of seconds to block for the result. Returns 200 with the
+    result if the job finished in time, otherwise 202 with a job id to poll.
+    """
+    camera, wait, error = check_trigger_request(request.args)
+    if error:
+        body, status_code = error
+        return jsonify(body), status_code
+    
+    job, coalesced = request_processing(camera)
+    if wait:
+        job.done.wait(wait)
+    
+    body, status_code = trigger_response(job, coalesced)
+    return jsonify(body), status_code
+
+@app.route('/api/jobs/<job_id>')
+def get_job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'error': f'Unknown job: {job_id}'}), 404
+    return jsonify(job.to_dict())
 
 if __name__ == "__main__":
     setup_directories()
+    rollups.init_db()
     print("Enhanced Stock Detection Edge Server Ready")
     print("Running on port 5001")
     print("API endpoints available at: http://localhost:5001/api/")
@@ -740,4 +1094,5 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\nShutting down server...")
         processing_active = False
+        processing_wakeup.set()
         processing_thread.join()
\ No newline at end of file
@@ -0,0 +1,398 @@
+"""Asyncio (ASGI) serving mode for the edge server.
+
+Serves the same routes and response formats as edge.py, but on Quart +
+Hypercorn instead of the threaded Flask development server:
+
+  * camera and detector calls use a shared httpx.AsyncClient
+  * SSE clients are async generators reading from asyncio queues, so an
+    idle dashboard costs a coroutine instead of an OS thread
+  * blocking CPU/disk work (shapely, PIL, cv2, log files) runs in the
+    default thread pool executor
+
+Analysis, logging and the shared state (latest_results,
+latest_annotated_image) are reused from edge.py.
+
+Run with:  python edge_async.py
+Requires:  quart, quart-cors, hypercorn, httpx (plus edge.py requirements)
+"""
+from quart import Quart, request, jsonify, Response
+from quart_cors import cors
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+import httpx
+import asyncio
+import datetime
+import time
+import json
+from io import BytesIO
+
+import edge
+import rollups
+import history_export
+
+app = Quart(__name__)
+app = cors(app, allow_origin="*")
+# SSE responses are infinite streams, never time them out
+app.config['RESPONSE_TIMEOUT'] = None
+
+SSE_HEARTBEAT_INTERVAL = 15
+SSE_CLIENT_QUEUE_SIZE = 100  # Events buffered per slow client before dropping
+
+# One asyncio queue per connected SSE client
+client_queues = []
+
+http_client = None
+processing_task = None
+camera_fetch = None  # In-flight camera snapshot shared by concurrent requests
+processing_wakeup = None  # asyncio.Event set when a job is triggered
+
+async def run_blocking(func, *args):
+    """Run blocking CPU or disk work in the default executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+async def fetch_camera_snapshot():
+    """Fetch one snapshot from the Mac camera, returns the httpx response"""
+    return await http_client.get(edge.MAC_CAMERA_URL, timeout=3)
+
+async def get_camera_snapshot():
+    """Get camera snapshot, coalescing concurrent callers onto one request"""
+    global camera_fetch
+    if camera_fetch is None or camera_fetch.done():
+        camera_fetch = asyncio.ensure_future(fetch_camera_snapshot())
+    # Shield so one cancelled client does not cancel the shared request
+    return await asyncio.shield(camera_fetch)
+
+async def get_camera_image():
+    """Get image from Mac camera via SSH tunnel, fallback to test image"""
+    if edge.CAMERA_SOURCE == "simulator":
+        return await run_blocking(edge.get_camera_image)
+
+    try:
+        response = await get_camera_snapshot()
+
+        if response.status_code == 200:
+            return response.content
+        else:
+            print(f"Mac camera returned status {response.status_code}")
+            return await run_blocking(edge.create_test_image_with_timestamp)
+
+    except httpx.HTTPError as e:
+        print(f"Mac camera connection failed: {e!r}")
+        return await run_blocking(edge.create_test_image_with_timestamp)
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return await run_blocking(edge.create_fallback_image)
+
+async def capture_image_from_mac():
+    """Capture image from Mac camera for processing"""
+    if edge.CAMERA_SOURCE == "simulator":
+        return await run_blocking(edge.capture_simulated_image)
+
+    try:
+        response = await get_camera_snapshot()
+        if response.status_code == 200:
+            return BytesIO(response.content)
+        else:
+            image_data = await run_blocking(edge.create_test_image_with_timestamp)
+            return BytesIO(image_data)
+    except Exception as e:
+        print(f"Error capturing image: {e!r}")
+        image_data = await run_blocking(edge.create_test_image_with_timestamp)
+        return BytesIO(image_data)
+
+async def detect_objects_local(image_data):
+    """Send image to local IoT Edge detector module"""
+    simulated_detection = edge.get_simulated_detection(image_data)
+    if simulated_detection is not None:
+        return simulated_detection
+
+    try:
+        response = await http_client.post(
+            edge.DETECTOR_MODULE_URL,
+            headers={'Content-Type': 'image/jpeg'},
+            content=edge.detector_payload(image_data),
+            timeout=30
+        )
+        return edge.read_detector_response(response)
+
+    except Exception as e:
+        print(f"Error communicating with detector module: {e!r}")
+        return None
+
+def notify_clients(data):
+    """Notify all connected clients via SSE"""
+    for client_queue in client_queues[:]:
+        try:
+            client_queue.put_nowait(data)
+        except asyncio.QueueFull:
+            # Slow client, drop this event rather than buffer without bound
+            print("SSE client queue full, dropping event")
+
+async def run_processing_cycle(camera=edge.CAMERA_ID):
+    """Capture, detect and analyse one image, returns the log entry or None"""
+    image_data = await capture_image_from_mac()
+    original_filename = await run_blocking(edge.save_original_image, image_data)
+
+    detection_results = await detect_objects_local(image_data)
+
+    if not detection_results:
+        print("❌ Detection failed")
+        return None
+
+    log_entry = await run_blocking(
+        edge.handle_detection_results, image_data, detection_results, original_filename, camera
+    )
+
+    notify_clients(json.dumps({
+        "type": "new_processing",
+        "data": log_entry
+    }))
+
+    print("✓ Processing completed successfully")
+    return log_entry
+
+async def periodic_processing():
+    """Process images from Mac camera on schedule and on demand"""
+    next_scheduled = time.time()
+
+    while edge.processing_active:
+        job = edge.claim_processing_job(next_scheduled)
+        if job is None:
+            try:
+                await asyncio.wait_for(processing_wakeup.wait(), timeout=max(0, next_scheduled - time.time()))
+            except asyncio.TimeoutError:
+                pass
+            processing_wakeup.clear()
+            continue
+
+        try:
+            print(f"\n=== Processing cycle started ({job.source}, job {job.id}) ===")
+            log_entry = await run_processing_cycle(job.camera)
+            edge.finish_job(job, log_entry, None if log_entry is not None else 'Detection failed')
+        except Exception as e:
+            print(f"❌ Error in processing cycle: {e}")
+            edge.finish_job(job, None, str(e))
+
+        # Any completed cycle, triggered or not, restarts the schedule
+        next_scheduled = time.time() + edge.PROCESS_INTERVAL
+
+async def wait_for_job(job, timeout):
+    """Wait up to timeout seconds for a job to finish without blocking the loop"""
+    loop = asyncio.get_running_loop()
+    finished = asyncio.Event()
+    job.add_done_callback(lambda job: loop.call_soon_threadsafe(finished.set))
+    try:
+        await asyncio.wait_for(finished.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+
+@app.before_serving
+async def startup():
+    global http_client, processing_task, processing_wakeup
+    http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=100))
+    processing_wakeup = asyncio.Event()
+    edge.processing_active = True
+    processing_task = asyncio.create_task(periodic_processing())
+
+@app.after_serving
+async def shutdown():
+    edge.processing_active = False
+    if processing_task:
+        processing_task.cancel()
+    await http_client.aclose()
+
+@app.route('/api/live-video')
+async def live_video():
+    """Serve a single JPEG image for the live video"""
+    try:
+        image_data = await get_camera_image()
+
+        response = Response(image_data, mimetype='image/jpeg')
+        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '0'
+        return response
+    except Exception as e:
+        print(f"Error serving live video: {e}")
+        fallback = await run_blocking(edge.create_fallback_image)
+        response = Response(fallback, mimetype='image/jpeg')
+        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+        return response
+
+@app.route('/api/test-mac-camera')
+async def test_mac_camera():
+    """Test connectivity to Mac camera"""
+    try:
+        response = await http_client.get(edge.MAC_CAMERA_URL, timeout=5)
+        return jsonify({
+            'status': 'success' if response.status_code == 200 else 'failed',
+            'status_code': response.status_code,
+            'image_size': len(response.content) if response.status_code == 200 else 0,
+            'url': edge.MAC_CAMERA_URL
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+            'url': edge.MAC_CAMERA_URL
+        })
+
+@app.route('/api/health')
+async def health_check():
+    return jsonify({
+        'status': 'healthy',
+        'processing_active': edge.processing_active,
+        'mac_camera_url': edge.MAC_CAMERA_URL,
+        'timestamp': datetime.datetime.now().isoformat()
+    })
+
+@app.route('/api/latest-results')
+async def get_latest_results():
+    return jsonify(edge.latest_results_summary())
+
+def read_history():
+    with open('dashboard_data/history.json', 'r') as f:
+        return json.load(f)
+
+@app.route('/api/history')
+async def get_history():
+    try:
+        history = await run_blocking(read_history)
+        return jsonify(history)
+    except:
+        return jsonify([])
+
+async def iterate_in_executor(iterator):
+    """Drive a blocking generator from the executor, one item at a time"""
+    loop = asyncio.get_running_loop()
+    done = object()
+    pending = None
+    try:
+        while True:
+            # Shielded so a disconnect cannot leave next() running during close()
+            pending = loop.run_in_executor(None, next, iterator, done)
+            item = await asyncio.shield(pending)
+            if item is done:
+                return
+            yield item
+    finally:
+        # Runs when the client disconnects too, closing the generator's open
+        # journal file and Parquet writer
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])
+        await run_blocking(iterator.close)
+
+@app.route('/api/export')
+async def export_history():
+    """Stream history or per-item detections, see history_export.parse_export_args"""
+    try:
+        query = history_export.parse_export_args(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+
+    mimetype, headers = history_export.export_headers(query)
+    chunks = history_export.export_chunks(default_camera=edge.CAMERA_ID, **query)
+    response = Response(iterate_in_executor(chunks), mimetype=mimetype, headers=headers)
+    response.timeout = None
+    return response
+
+@app.route('/api/alerts')
+async def get_active_alerts():
+    """Currently open alerts; the SSE stream only carries their transitions"""
+    return jsonify(edge.alert_engine.active_alerts())
+
+@app.route('/api/rollups')
+async def get_rollups():
+    """Aggregated trends, see rollups.parse_query_args for parameters"""
+    try:
+        query = rollups.parse_query_args(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    return jsonify(await run_blocking(lambda: rollups.query_rollups(**query)))
+
+@app.route('/api/events')
+async def sse_events():
+    """Server-Sent Events endpoint for real-time updates"""
+    async def event_stream():
+        client_queue = asyncio.Queue(maxsize=SSE_CLIENT_QUEUE_SIZE)
+        client_queues.append(client_queue)
+        print(f"New SSE client connected. Total clients: {len(client_queues)}")
+
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(client_queue.get(), timeout=SSE_HEARTBEAT_INTERVAL)
+                    yield f"data: {data}\n\n".encode()
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+        finally:
+            # Runs on client disconnect (cancellation) as well as errors
+            if client_queue in client_queues:
+                client_queues.remove(client_queue)
+                print(f"Removed SSE client. Total clients: {len(client_queues)}")
+
+    response = Response(event_stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None
+    return response
+
+@app.after_request
+async def after_request(response):
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+
+    if request.path == '/api/events':
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+
+    return response
+
+@app.route('/api/annotated-image')
+async def get_annotated_image():
+    if edge.latest_annotated_image:
+        return Response(edge.latest_annotated_image, mimetype='image/jpeg')
+    return "No image", 404
+
+@app.route('/api/trigger-processing', methods=['GET', 'POST'])
+async def trigger_processing():
+    """Trigger an immediate processing cycle, see edge.trigger_processing"""
+    camera, wait, error = edge.check_trigger_request(request.args)
+    if error:
+        body, status_code = error
+        return jsonify(body), status_code
+
+    job, coalesced = edge.request_processing(camera)
+    processing_wakeup.set()
+    if wait:
+        await wait_for_job(job, wait)
+
+    body, status_code = edge.trigger_response(job, coalesced)
+    return jsonify(body), status_code
+
+@app.route('/api/jobs/<job_id>')
+async def get_job_status(job_id):
+    job = edge.get_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'error': f'Unknown job: {job_id}'}), 404
+    return jsonify(job.to_dict())
+
+if __name__ == "__main__":
+    edge.setup_directories()
+    rollups.init_db()
+    print("Enhanced Stock Detection Edge Server Ready (asyncio mode)")
+    print("Running on port 5001")
+    print("API endpoints available at: http://localhost:5001/api/")
+    print("Live video stream: http://localhost:5001/api/live-video")
+
+    config = Config()
+    config.bind = ["0.0.0.0:5001"]
+    config.backlog = 2048
+    # Keep idle dashboard connections open across the SSE heartbeat interval
+    config.keep_alive_timeout = SSE_HEARTBEAT_INTERVAL * 2
+
+    try:
+        asyncio.run(serve(app, config))
+    except KeyboardInterrupt:
+        print("\nShutting down server...")
@@ -0,0 +1,351 @@
+"""Streaming export of inspection history.
+
+Every detailed log entry is appended to a daily NDJSON journal
+(logs/history/YYYY-MM-DD.ndjson). Exports read the journal days in the
+requested range line by line and yield encoded chunks, so an export of
+months of data runs in constant memory whatever its size.
+
+Two kinds of rows can be exported:
+  * history    - one row per processing cycle with the summary counts
+  * detections - one row per detected item with its confidence and placement
+
+as NDJSON, CSV or Parquet (Parquet needs pyarrow). NDJSON and CSV can be
+gzip-compressed while streaming; Parquet uses its own column compression.
+
+Command line use, from the edge server's working directory:
+
+    python history_export.py --kind detections --format csv --start 2026-01-01 -o out.csv
+    python history_export.py --backfill   # journal logs written before the journal existed
+"""
+import argparse
+import csv
+import datetime
+import glob
+import io
+import json
+import os
+import sys
+import zlib
+
+from rollups import parse_datetime
+
+JOURNAL_DIR = "logs/history"
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+KINDS = ('history', 'detections')
+COMPRESSIONS = ('none', 'gzip')
+
+ROWS_PER_CHUNK = 500  # Rows encoded per yielded chunk / Parquet row group
+
+HISTORY_FIELDS = [
+    'timestamp', 'camera_id', 'total_expected', 'total_detected', 'correctly_placed',
+    'misplaced', 'missing_items', 'extra_items', 'alert_count', 'detailed_counts',
+    'missing_by_item', 'extra_by_item', 'image_path', 'annotated_image_path'
+]
+DETECTION_FIELDS = ['timestamp', 'camera_id', 'item_type', 'confidence', 'placement', 'perishable']
+
+def journal_path(day, journal_dir=JOURNAL_DIR):
+    return os.path.join(journal_dir, f"{day.isoformat()}.ndjson")
+
+def append_to_journal(log_entry, journal_dir=JOURNAL_DIR):
+    """Append one log entry to its day's journal file"""
+    try:
+        day = datetime.datetime.fromisoformat(log_entry['timestamp']).date()
+        os.makedirs(journal_dir, exist_ok=True)
+        with open(journal_path(day, journal_dir), 'a') as f:
+            f.write(json.dumps(log_entry) + "\n")
+    except Exception as e:
+        print(f"Error appending to history journal: {e}")
+
+def journal_days(start=None, end=None, journal_dir=JOURNAL_DIR):
+    """Journal files covering [start, end), oldest first"""
+    if not os.path.isdir(journal_dir):
+        return []
+    paths = []
+    for name in sorted(os.listdir(journal_dir)):
+        if not name.endswith('.ndjson'):
+            continue
+        try:
+            day = datetime.date.fromisoformat(name[:-len('.ndjson')])
+        except ValueError:
+            continue
+        if start is not None and day < start.date():
+            continue
+        if end is not None and day > end.date():
+            continue
+        paths.append(os.path.join(journal_dir, name))
+    return paths
+
+def iter_entries(start=None, end=None, camera=None, default_camera=None, journal_dir=JOURNAL_DIR):
+    """Yield log entries with start <= timestamp < end, one line at a time"""
+    for path in journal_days(start, end, journal_dir):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    timestamp = datetime.datetime.fromisoformat(entry['timestamp'])
+                except (ValueError, KeyError):
+                    # A line still being written by the processing thread
+                    continue
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp >= end:
+                    continue
+                if camera and entry.get('camera_id', default_camera) != camera:
+                    continue
+                yield entry
+
+def opened_alerts(entry):
+    """Alerts opened in a cycle; entry['alerts'] also holds escalations and resolutions"""
+    # Logs from before alert lifecycles have no state, every alert was new
+    return sum(1 for alert in entry.get('alerts', []) if alert.get('state', 'opened') == 'opened')
+
+def history_rows(entries, default_camera=None):
+    for entry in entries:
+        summary = entry.get('summary', {})
+        yield {
+            'timestamp': entry['timestamp'],
+            'camera_id': entry.get('camera_id', default_camera),
+            'total_expected': summary.get('total_expected'),
+            'total_detected': summary.get('total_detected'),
+            'correctly_placed': summary.get('correctly_placed'),
+            'misplaced': summary.get('misplaced'),
+            'missing_items': summary.get('missing_items'),
+            'extra_items': summary.get('extra_items'),
+            'alert_count': opened_alerts(entry),
+            'detailed_counts': entry.get('detailed_counts', {}),
+            'missing_by_item': entry.get('missing_items', {}),
+            'extra_by_item': entry.get('extra_items', {}),
+            'image_path': entry.get('image_path'),
+            'annotated_image_path': entry.get('annotated_image_path')
+        }
+
+def detection_rows(entries, default_camera=None):
+    for entry in entries:
+        placements = [
+            ('correct', entry.get('correctly_placed_items', [])),
+            ('misplaced', entry.get('misplaced_items', []))
+        ]
+        for placement, items in placements:
+            for item in items:
+                yield {
+                    'timestamp': entry['timestamp'],
+                    'camera_id': entry.get('camera_id', default_camera),
+                    'item_type': item['type'],
+                    'confidence': item['confidence'],
+                    'placement': placement,
+                    'perishable': item.get('perishable', False)
+                }
+
+def batched(rows, size=ROWS_PER_CHUNK):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def flat_value(value):
+    """Nested values are stored as JSON text in CSV and Parquet"""
+    return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+def encode_ndjson(rows, fields):
+    for batch in batched(rows):
+        yield "".join(json.dumps(row) + "\n" for row in batch).encode()
+
+def encode_csv(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for batch in batched(rows):
+        writer.writerows({key: flat_value(value) for key, value in row.items()} for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+class DrainableBuffer(io.RawIOBase):
+    """Write-only sink whose contents are handed out and dropped after each row group"""
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def encode_parquet(rows, fields, compression='none'):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow")
+
+    types = {
+        'confidence': pa.float64(), 'perishable': pa.bool_(),
+        'total_expected': pa.int64(), 'total_detected': pa.int64(), 'correctly_placed': pa.int64(),
+        'misplaced': pa.int64(), 'missing_items': pa.int64(), 'extra_items': pa.int64(),
+        'alert_count': pa.int64()
+    }
+    schema = pa.schema([(field, types.get(field, pa.string())) for field in fields])
+    sink = DrainableBuffer()
+    codec = 'gzip' if compression == 'gzip' else 'snappy'
+    writer = pq.ParquetWriter(sink, schema, compression=codec)
+    try:
+        for batch in batched(rows):
+            columns = {field: [flat_value(row[field]) for row in batch] for field in fields}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def gzip_stream(chunks):
+    """Gzip a stream of byte chunks without holding it in memory"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_chunks(kind='history', fmt='ndjson', start=None, end=None, camera=None,
+                  compression='none', default_camera=None, journal_dir=JOURNAL_DIR):
+    """Yield the encoded export as byte chunks"""
+    entries = iter_entries(start, end, camera, default_camera, journal_dir)
+    if kind == 'history':
+        rows, fields = history_rows(entries, default_camera), HISTORY_FIELDS
+    else:
+        rows, fields = detection_rows(entries, default_camera), DETECTION_FIELDS
+
+    if fmt == 'parquet':
+        return encode_parquet(rows, fields, compression)
+
+    chunks = encode_ndjson(rows, fields) if fmt == 'ndjson' else encode_csv(rows, fields)
+    return gzip_stream(chunks) if compression == 'gzip' else chunks
+
+def parse_export_args(args):
+    """Turn /api/export query parameters into export_chunks keyword arguments"""
+    query = {
+        'kind': args.get('kind', 'history'),
+        'fmt': args.get('format', 'ndjson'),
+        'camera': args.get('camera'),
+        'compression': args.get('compress', 'none'),
+        'start': parse_datetime(args.get('start')),
+        'end': parse_datetime(args.get('end'))
+    }
+    if query['kind'] not in KINDS:
+        raise ValueError(f"kind must be one of: {', '.join(KINDS)}")
+    if query['fmt'] not in FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+    if query['compression'] not in COMPRESSIONS:
+        raise ValueError(f"compress must be one of: {', '.join(COMPRESSIONS)}")
+    if query['fmt'] == 'parquet':
+        try:
+            import pyarrow
+        except ImportError:
+            raise ValueError("Parquet export requires pyarrow")
+    return query
+
+def export_headers(query):
+    """Content type and download name for an export"""
+    mimetype, extension = FORMATS[query['fmt']]
+    filename = f"{query['kind']}.{extension}"
+    if query['compression'] == 'gzip' and query['fmt'] != 'parquet':
+        mimetype = 'application/gzip'
+        filename += '.gz'
+    return mimetype, {'Content-Disposition': f'attachment; filename="{filename}"'}
+
+def journaled_timestamps(day, journal_dir=JOURNAL_DIR):
+    """Timestamps already written to one day's journal"""
+    timestamps = set()
+    path = journal_path(day, journal_dir)
+    if not os.path.exists(path):
+        return timestamps
+    with open(path) as f:
+        for line in f:
+            try:
+                timestamps.add(json.loads(line)['timestamp'])
+            except (ValueError, KeyError):
+                continue
+    return timestamps
+
+def backfill_journal(logs_dir='logs', journal_dir=JOURNAL_DIR):
+    """Journal stock_check_*.json logs whose timestamp is not in the journal yet"""
+    journaled = {}  # day -> timestamps in that day's journal
+    written = 0
+    for path in sorted(glob.glob(os.path.join(logs_dir, 'stock_check_*.json'))):
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            day = datetime.datetime.fromisoformat(entry['timestamp']).date()
+        except (ValueError, KeyError, OSError) as e:
+            print(f"Skipping {path}: {e}")
+            continue
+        if day not in journaled:
+            journaled[day] = journaled_timestamps(day, journal_dir)
+        if entry['timestamp'] in journaled[day]:
+            continue
+        append_to_journal(entry, journal_dir)
+        journaled[day].add(entry['timestamp'])
+        written += 1
+    print(f"Backfilled {written} log entries into {journal_dir}")
+
+def datetime_arg(value):
+    """argparse type for --start/--end, so bad input is a usage error"""
+    try:
+        return parse_datetime(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not an ISO date/time: {value!r}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export inspection history from the edge server's logs")
+    parser.add_argument('--kind', choices=KINDS, default='history')
+    parser.add_argument('--format', choices=list(FORMATS), default='ndjson')
+    parser.add_argument('--start', type=datetime_arg, help='ISO date/time, inclusive')
+    parser.add_argument('--end', type=datetime_arg, help='ISO date/time, exclusive')
+    parser.add_argument('--camera', help='only this camera id')
+    parser.add_argument('--compress', choices=COMPRESSIONS, default='none')
+    parser.add_argument('--journal-dir', default=JOURNAL_DIR)
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    parser.add_argument('--backfill', action='store_true',
+                        help='journal existing logs/stock_check_*.json files and exit')
+    args = parser.parse_args()
+
+    if args.backfill:
+        backfill_journal(journal_dir=args.journal_dir)
+        return
+
+    chunks = export_chunks(
+        kind=args.kind, fmt=args.format, start=args.start, end=args.end,
+        camera=args.camera, compression=args.compress, journal_dir=args.journal_dir
+    )
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""Time-bucketed analytics rollups for inspection results.
+
+Every processing cycle updates per-minute, per-hour and per-day aggregates
+for each (camera, item type) in a small SQLite database, so trend queries
+read O(buckets) rows instead of replaying raw cycles.
+
+Each bucket holds:
+  * samples, count_sum, count_min, count_max - detected count statistics
+  * stockout_seconds - time the item was below its expected count; a cycle
+    that sees a stockout is credited with the time since the camera's
+    previous cycle (capped at max_gap)
+  * misplaced_samples, misplaced_count - cycles with at least one misplaced
+    item, and the total number of misplaced detections
+  * alert_count - alerts opened for the item
+"""
+import sqlite3
+import datetime
+import time
+
+ROLLUP_DB = "dashboard_data/rollups.db"
+
+RESOLUTIONS = ('minute', 'hour', 'day')
+
+# How long buckets are kept, None keeps them forever
+RETENTION = {
+    'minute': datetime.timedelta(days=7),
+    'hour': datetime.timedelta(days=180),
+    'day': None
+}
+
+# Range returned when a query does not give a start time
+DEFAULT_QUERY_SPAN = {
+    'minute': datetime.timedelta(hours=2),
+    'hour': datetime.timedelta(days=7),
+    'day': datetime.timedelta(days=90)
+}
+
+PRUNE_INTERVAL = 3600  # Seconds between retention sweeps
+
+last_prune = 0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    resolution TEXT NOT NULL,
+    camera_id TEXT NOT NULL,
+    item_type TEXT NOT NULL,
+    bucket_start TEXT NOT NULL,
+    samples INTEGER NOT NULL,
+    count_sum INTEGER NOT NULL,
+    count_min INTEGER NOT NULL,
+    count_max INTEGER NOT NULL,
+    stockout_seconds REAL NOT NULL,
+    misplaced_samples INTEGER NOT NULL,
+    misplaced_count INTEGER NOT NULL,
+    alert_count INTEGER NOT NULL,
+    PRIMARY KEY (resolution, camera_id, item_type, bucket_start)
+);
+CREATE INDEX IF NOT EXISTS rollups_by_time ON rollups (resolution, bucket_start);
+CREATE TABLE IF NOT EXISTS rollup_cameras (
+    camera_id TEXT PRIMARY KEY,
+    last_timestamp TEXT NOT NULL
+);
+"""
+
+UPSERT = """
+INSERT INTO rollups VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (resolution, camera_id, item_type, bucket_start) DO UPDATE SET
+    samples = samples + 1,
+    count_sum = count_sum + excluded.count_sum,
+    count_min = MIN(count_min, excluded.count_min),
+    count_max = MAX(count_max, excluded.count_max),
+    stockout_seconds = stockout_seconds + excluded.stockout_seconds,
+    misplaced_samples = misplaced_samples + excluded.misplaced_samples,
+    misplaced_count = misplaced_count + excluded.misplaced_count,
+    alert_count = alert_count + excluded.alert_count
+"""
+
+def init_db(db_path=ROLLUP_DB):
+    """Create the schema and enable WAL, once at server startup"""
+    conn = sqlite3.connect(db_path, timeout=10)
+    try:
+        # WAL lets dashboard queries read while a cycle is being recorded,
+        # and is a persistent setting of the database file
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+    finally:
+        conn.close()
+
+def connect(db_path=ROLLUP_DB):
+    """Open the rollup database, see init_db for the schema"""
+    conn = sqlite3.connect(db_path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def parse_datetime(value):
+    """Parse an ISO date/time query parameter into the edge device's local time"""
+    if not value:
+        return None
+    moment = datetime.datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        # Logs and buckets are stored in the edge device's local time
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+def bucket_start(timestamp, resolution):
+    """Truncate a datetime to the start of its bucket"""
+    if resolution == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown resolution: {resolution}")
+
+def item_samples(log_entry):
+    """Per item type statistics for a single cycle"""
+    item_types = set(log_entry['detailed_counts']) | set(log_entry['missing_items'])
+
+    misplaced = {}
+    for item in log_entry['misplaced_items']:
+        misplaced[item['type']] = misplaced.get(item['type'], 0) + 1
+
+    # Count each alert once, when it opens
+    alerts = {}
+    for alert in log_entry.get('alerts', []):
+        if 'item' in alert and alert.get('state', 'opened') == 'opened':
+            alerts[alert['item']] = alerts.get(alert['item'], 0) + 1
+
+    samples = {}
+    for item_type in item_types | set(misplaced):
+        samples[item_type] = {
+            'count': log_entry['detailed_counts'].get(item_type, 0),
+            'stockout': item_type in log_entry['missing_items'],
+            'misplaced': misplaced.get(item_type, 0),
+            'alerts': alerts.get(item_type, 0)
+        }
+    return samples
+
+def record_cycle(log_entry, max_gap=120, db_path=ROLLUP_DB):
+    """Fold one processing cycle's log entry into every rollup resolution"""
+    try:
+        timestamp = datetime.datetime.fromisoformat(log_entry['timestamp'])
+        camera = log_entry.get('camera_id', 'default')
+
+        conn = connect(db_path)
+        try:
+            with conn:
+                row = conn.execute(
+                    "SELECT last_timestamp FROM rollup_cameras WHERE camera_id = ?", (camera,)
+                ).fetchone()
+                elapsed = 0.0
+                if row is not None:
+                    previous = datetime.datetime.fromisoformat(row['last_timestamp'])
+                    elapsed = min(max((timestamp - previous).total_seconds(), 0.0), max_gap)
+
+                rows = []
+                for item_type, sample in item_samples(log_entry).items():
+                    for resolution in RESOLUTIONS:
+                        rows.append((
+                            resolution, camera, item_type,
+                            bucket_start(timestamp, resolution).isoformat(),
+                            sample['count'], sample['count'], sample['count'],
+                            elapsed if sample['stockout'] else 0.0,
+                            1 if sample['misplaced'] else 0,
+                            sample['misplaced'],
+                            sample['alerts']
+                        ))
+                conn.executemany(UPSERT, rows)
+                conn.execute(
+                    "INSERT OR REPLACE INTO rollup_cameras VALUES (?, ?)",
+                    (camera, timestamp.isoformat())
+                )
+            prune_expired(conn)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Error updating rollups: {e}")
+
+def prune_expired(conn):
+    """Drop buckets past their retention, at most once per PRUNE_INTERVAL"""
+    global last_prune
+    if time.time() - last_prune < PRUNE_INTERVAL:
+        return
+    last_prune = time.time()
+
+    now = datetime.datetime.now()
+    with conn:
+        for resolution, retention in RETENTION.items():
+            if retention is None:
+                continue
+            conn.execute(
+                "DELETE FROM rollups WHERE resolution = ? AND bucket_start < ?",
+                (resolution, (now - retention).isoformat())
+            )
+
+def query_rollups(resolution, start=None, end=None, camera=None, item_type=None, db_path=ROLLUP_DB):
+    """Return the buckets of one resolution starting in [start, end), oldest first"""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+
+    end = end or datetime.datetime.now()
+    start = start or end - DEFAULT_QUERY_SPAN[resolution]
+
+    sql = "SELECT * FROM rollups WHERE resolution = ? AND bucket_start >= ? AND bucket_start < ?"
+    params = [resolution, bucket_start(start, resolution).isoformat(), end.isoformat()]
+    if camera:
+        sql += " AND camera_id = ?"
+        params.append(camera)
+    if item_type:
+        sql += " AND item_type = ?"
+        params.append(item_type)
+    sql += " ORDER BY bucket_start, camera_id, item_type"
+
+    conn = connect(db_path)
+    try:
+        buckets = []
+        for row in conn.execute(sql, params):
+            buckets.append({
+                'bucket_start': row['bucket_start'],
+                'camera_id': row['camera_id'],
+                'item_type': row['item_type'],
+                'samples': row['samples'],
+                'mean_count': row['count_sum'] / row['samples'],
+                'min_count': row['count_min'],
+                'max_count': row['count_max'],
+                'stockout_seconds': row['stockout_seconds'],
+                'misplaced_samples': row['misplaced_samples'],
+                'misplaced_count': row['misplaced_count'],
+                'misplacement_rate': row['misplaced_samples'] / row['samples'],
+                'alert_count': row['alert_count']
+            })
+        return {
+            'resolution': resolution,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'buckets': buckets
+        }
+    finally:
+        conn.close()
+
+def parse_query_args(args):
+    """Turn /api/rollups query parameters into query_rollups keyword arguments"""
+    query = {
+        'resolution': args.get('resolution', 'hour'),
+        'camera': args.get('camera'),
+        'item_type': args.get('item'),
+        'start': parse_datetime(args.get('start')),
+        'end': parse_datetime(args.get('end'))
+    }
+    if query['resolution'] not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of: {', '.join(RESOLUTIONS)}")
+    return query
@@ -0,0 +1,565 @@
+"""Load-test harness for the edge server (edge.py / edge_async.py).
+
+Runs entirely offline on one machine:
+
+  * stub camera server mimicking vid.py's /snapshot
+  * stub detector server mimicking the Custom Vision /image JSON response
+    (both with configurable latency and failure rate)
+  * N SSE subscribers on /api/events and M pollers on /api/live-video and
+    /api/history, plus an optional /api/trigger-processing driver
+  * a report of p50/p95/p99 latency, throughput, dropped SSE events and
+    edge server memory (RSS) over time
+
+Example, launching the asyncio server against the stubs:
+
+    python loadtest.py --launch-edge async --sse 2000 --pollers 200 --duration 120
+
+Use --launch-edge none to test an already running server; it must have been
+started with MAC_CAMERA_URL / DETECTOR_MODULE_URL pointing at the stubs.
+A launched server runs in a scratch directory that is removed afterwards
+unless --keep-edge-dir is given or the server failed to start.
+Thousands of SSE subscribers need a matching open file limit (ulimit -n).
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from io import BytesIO
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from PIL import Image, ImageDraw
+
+EDGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'edge-deployment')
+EDGE_SCRIPTS = {'sync': 'edge.py', 'async': 'edge_async.py'}
+
+# Predictions matching edge.py's EXPECTED_SHELF_ZONES and EXPECTED_INVENTORY
+STUB_PREDICTIONS = [
+    ('bottle', 0.15, 0.10, 0.10, 0.60),
+    ('tea bottle', 0.45, 0.40, 0.10, 0.50),
+    ('cup', 0.67, 0.65, 0.07, 0.20),
+    ('cup', 0.76, 0.65, 0.07, 0.20),
+]
+
+def create_stub_image(width=640, height=480):
+    """JPEG with a rectangle per stub prediction"""
+    im = Image.new('RGB', (width, height), (50, 50, 50))
+    draw = ImageDraw.Draw(im)
+    for tag, left, top, w, h in STUB_PREDICTIONS:
+        draw.rectangle([left * width, top * height, (left + w) * width, (top + h) * height], fill=(0, 160, 0))
+    out = BytesIO()
+    im.save(out, format='JPEG', quality=90)
+    return out.getvalue()
+
+def stub_detector_response():
+    """Body in the shape returned by the exported Custom Vision module"""
+    return {
+        'id': '',
+        'project': '',
+        'iteration': '',
+        'created': datetime.datetime.now().isoformat(),
+        'predictions': [
+            {
+                'probability': round(random.uniform(0.8, 0.99), 6),
+                'tagId': index,
+                'tagName': tag,
+                'boundingBox': {'left': left, 'top': top, 'width': w, 'height': h}
+            } for index, (tag, left, top, w, h) in enumerate(STUB_PREDICTIONS)
+        ]
+    }
+
+class StubStats:
+    """Request counters shared by the stub server threads"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.served = 0
+        self.failed = 0
+
+    def record(self, ok):
+        with self.lock:
+            if ok:
+                self.served += 1
+            else:
+                self.failed += 1
+
+def make_stub_handler(stats, latency, failure_rate, image):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def delay_or_fail(self):
+            """Apply configured latency, returns False if the request should fail"""
+            if latency:
+                time.sleep(latency * random.uniform(0.5, 1.5))
+            if random.random() < failure_rate:
+                stats.record(False)
+                self.send_body(500, 'text/plain', b'Injected failure')
+                return False
+            return True
+
+        def send_body(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/snapshot':
+                self.send_body(404, 'text/plain', b'Not found')
+                return
+            if self.delay_or_fail():
+                stats.record(True)
+                self.send_body(200, 'image/jpeg', image)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.path.split('?')[0] != '/image':
+                self.send_body(404, 'text/plain', b'Not found')
+                return
+            if self.delay_or_fail():
+                stats.record(True)
+                self.send_body(200, 'application/json', json.dumps(stub_detector_response()).encode())
+
+    return StubHandler
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response are expected under load and at shutdown
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+def start_stub_server(port, stats, latency, failure_rate, image=None):
+    server = StubServer(('127.0.0.1', port), make_stub_handler(stats, latency, failure_rate, image))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def read_rss_kb(pid):
+    """Resident set size of a process in kB, None if unavailable"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        url = urlsplit(args.edge_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.endpoints = {}
+        self.sse_connected = 0
+        self.sse_failures = 0
+        self.sse_received = {}  # subscriber index -> set of event keys
+        self.sse_joined = {}  # subscriber index -> time of first successful connect
+        self.event_times = {}  # event key -> time the edge server produced it
+        self.event_lags = []
+        self.memory = []  # (elapsed seconds, edge RSS kB, harness RSS kB)
+        self.stop = asyncio.Event()
+        self.started = None
+
+    def stats_for(self, name):
+        if name not in self.endpoints:
+            self.endpoints[name] = EndpointStats()
+        return self.endpoints[name]
+
+    async def request(self, method, path):
+        """One HTTP/1.1 request on a fresh connection, returns (status, body)"""
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(
+                f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nConnection: close\r\nContent-Length: 0\r\n\r\n".encode()
+            )
+            await writer.drain()
+            status, headers = await self.read_head(reader)
+            if 'content-length' in headers:
+                body = await reader.readexactly(int(headers['content-length']))
+            elif headers.get('transfer-encoding') == 'chunked':
+                body = await self.read_chunked(reader)
+            else:
+                body = await reader.read()
+            return status, body
+        finally:
+            writer.close()
+
+    async def read_head(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError('Connection closed before response')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    async def read_chunked(self, reader):
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                return bytes(body)
+            body += await reader.readexactly(size)
+            await reader.readline()
+
+    async def timed_request(self, name, method, path):
+        stats = self.stats_for(name)
+        started = time.perf_counter()
+        try:
+            status, body = await self.request(method, path)
+            if status >= 400:
+                stats.errors += 1
+                return None
+            stats.latencies.append(time.perf_counter() - started)
+            return body
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            stats.errors += 1
+            return None
+
+    async def poller(self, index):
+        """Alternate between the live video and history endpoints"""
+        paths = [('live-video', '/api/live-video'), ('history', '/api/history')]
+        # Spread pollers over the interval instead of firing in lockstep
+        await asyncio.sleep(random.uniform(0, self.args.poll_interval))
+        turn = index
+        while not self.stop.is_set():
+            name, path = paths[turn % len(paths)]
+            turn += 1
+            await self.timed_request(name, 'GET', f"{path}?t={time.time()}")
+            await asyncio.sleep(self.args.poll_interval)
+
+    async def trigger_driver(self):
+        while not self.stop.is_set():
+            await self.timed_request('trigger-processing', 'POST', '/api/trigger-processing')
+            try:
+                await asyncio.wait_for(self.stop.wait(), timeout=self.args.trigger_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def sse_subscriber(self, index):
+        received = self.sse_received.setdefault(index, set())
+        while not self.stop.is_set():
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError:
+                self.sse_failures += 1
+                await asyncio.sleep(1)
+                continue
+            try:
+                writer.write(
+                    f"GET /api/events HTTP/1.1\r\nHost: {self.host}\r\nAccept: text/event-stream\r\n\r\n".encode()
+                )
+                await writer.drain()
+                status, headers = await self.read_head(reader)
+                if status != 200:
+                    raise ConnectionError(f'SSE status {status}')
+                self.sse_connected += 1
+                self.sse_joined.setdefault(index, datetime.datetime.now())
+                try:
+                    await self.read_events(reader, received, headers.get('transfer-encoding') == 'chunked')
+                finally:
+                    self.sse_connected -= 1
+            except (OSError, ValueError, asyncio.IncompleteReadError):
+                if not self.stop.is_set():
+                    self.sse_failures += 1
+                    await asyncio.sleep(1)
+            finally:
+                writer.close()
+
+    async def read_events(self, reader, received, chunked):
+        buffer = b''
+        while not self.stop.is_set():
+            if chunked:
+                size_line = await reader.readline()
+                if not size_line:
+                    raise ConnectionError('SSE stream closed')
+                size = int(size_line.split(b';')[0], 16)
+                if size == 0:
+                    raise ConnectionError('SSE stream ended')
+                buffer += await reader.readexactly(size)
+                await reader.readline()
+            else:
+                data = await reader.read(65536)
+                if not data:
+                    raise ConnectionError('SSE stream closed')
+                buffer += data
+
+            while b'\n\n' in buffer:
+                event, buffer = buffer.split(b'\n\n', 1)
+                self.handle_event(event, received)
+
+    def handle_event(self, event, received):
+        for line in event.split(b'\n'):
+            if not line.startswith(b'data: '):
+                continue
+            try:
+                message = json.loads(line[6:])
+            except ValueError:
+                continue
+            if message.get('type') != 'new_processing':
+                continue
+            entry = message['data']
+            key = (entry.get('camera_id'), entry['timestamp'])
+            received.add(key)
+            try:
+                produced = datetime.datetime.fromisoformat(entry['timestamp'])
+            except ValueError:
+                continue
+            self.event_times[key] = produced
+            self.event_lags.append((datetime.datetime.now() - produced).total_seconds())
+
+    async def monitor(self, edge_pid):
+        last_counts = {}
+        while not self.stop.is_set():
+            try:
+                await asyncio.wait_for(self.stop.wait(), timeout=self.args.report_interval)
+            except asyncio.TimeoutError:
+                pass
+            elapsed = time.time() - self.started
+            edge_rss = read_rss_kb(edge_pid) if edge_pid else None
+            self.memory.append((elapsed, edge_rss, read_rss_kb(os.getpid())))
+
+            rates = []
+            for name, stats in sorted(self.endpoints.items()):
+                done = len(stats.latencies)
+                rates.append(f"{name} {(done - last_counts.get(name, 0)) / self.args.report_interval:.1f}/s")
+                last_counts[name] = done
+            events = len(set().union(*self.sse_received.values())) if self.sse_received else 0
+            rss = f"{edge_rss / 1024:.1f} MB" if edge_rss else 'n/a'
+            print(f"[{elapsed:6.1f}s] sse connected {self.sse_connected}/{self.args.sse}, "
+                  f"events {events}, edge rss {rss} | " + ', '.join(rates))
+
+    async def run(self, edge_pid):
+        self.started = time.time()
+        tasks = [asyncio.create_task(self.sse_subscriber(i)) for i in range(self.args.sse)]
+        tasks += [asyncio.create_task(self.poller(i)) for i in range(self.args.pollers)]
+        if self.args.trigger_interval > 0:
+            tasks.append(asyncio.create_task(self.trigger_driver()))
+        tasks.append(asyncio.create_task(self.monitor(edge_pid)))
+
+        await asyncio.sleep(self.args.duration)
+        # Let events from the last cycle reach the subscribers
+        await asyncio.sleep(self.args.drain)
+        self.stop.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def report(self, detector_stats, camera_stats):
+        duration = time.time() - self.started
+        summary = {'duration_seconds': round(duration, 1), 'endpoints': {}}
+
+        print("\n=== Load test report ===")
+        print(f"Duration: {duration:.1f}s, SSE subscribers: {self.args.sse}, pollers: {self.args.pollers}")
+        print(f"\n{'endpoint':<20}{'ok':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for name, stats in sorted(self.endpoints.items()):
+            latencies = sorted(stats.latencies)
+            row = {
+                'ok': len(latencies),
+                'errors': stats.errors,
+                'throughput': len(latencies) / duration,
+                'p50_ms': (percentile(latencies, 50) or 0) * 1000,
+                'p95_ms': (percentile(latencies, 95) or 0) * 1000,
+                'p99_ms': (percentile(latencies, 99) or 0) * 1000
+            }
+            summary['endpoints'][name] = row
+            print(f"{name:<20}{row['ok']:>8}{row['errors']:>8}{row['throughput']:>9.1f}"
+                  f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}")
+
+        # An event any subscriber saw was broadcast to every subscriber that
+        # had already connected when it was produced
+        all_events = set().union(*self.sse_received.values()) if self.sse_received else set()
+        dropped = 0
+        for index, received in self.sse_received.items():
+            joined = self.sse_joined.get(index)
+            if joined is None:
+                continue
+            dropped += sum(
+                1 for key in all_events - received
+                if key in self.event_times and self.event_times[key] >= joined
+            )
+        lags = sorted(self.event_lags)
+        summary['sse'] = {
+            'events_broadcast': len(all_events),
+            'events_received': sum(len(received) for received in self.sse_received.values()),
+            'events_dropped': dropped,
+            'connection_failures': self.sse_failures,
+            'lag_p50_ms': (percentile(lags, 50) or 0) * 1000,
+            'lag_p95_ms': (percentile(lags, 95) or 0) * 1000,
+            'lag_p99_ms': (percentile(lags, 99) or 0) * 1000
+        }
+        sse = summary['sse']
+        print(f"\nSSE: {sse['events_broadcast']} events broadcast, {sse['events_received']} received, "
+              f"{sse['events_dropped']} dropped, {sse['connection_failures']} connection failures")
+        print(f"SSE delivery lag: p50 {sse['lag_p50_ms']:.1f} ms, p95 {sse['lag_p95_ms']:.1f} ms, "
+              f"p99 {sse['lag_p99_ms']:.1f} ms")
+
+        summary['stubs'] = {
+            'camera_served': camera_stats.served, 'camera_failed': camera_stats.failed,
+            'detector_served': detector_stats.served, 'detector_failed': detector_stats.failed
+        }
+        print(f"Stubs: camera {camera_stats.served} ok / {camera_stats.failed} failed, "
+              f"detector {detector_stats.served} ok / {detector_stats.failed} failed")
+
+        summary['memory'] = [
+            {'elapsed_seconds': round(t, 1), 'edge_rss_kb': edge, 'harness_rss_kb': harness}
+            for t, edge, harness in self.memory
+        ]
+        edge_samples = [edge for _, edge, _ in self.memory if edge]
+        if edge_samples:
+            growth = edge_samples[-1] - edge_samples[0]
+            print(f"Edge RSS: start {edge_samples[0] / 1024:.1f} MB, peak {max(edge_samples) / 1024:.1f} MB, "
+                  f"end {edge_samples[-1] / 1024:.1f} MB, growth {growth / 1024:+.1f} MB")
+        return summary
+
+async def wait_for_edge(host, port, timeout, process=None):
+    """Wait until the edge accepts connections, False on timeout or if process exits"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return True
+        except OSError:
+            await asyncio.sleep(0.5)
+    return False
+
+def port_in_use(host, port):
+    try:
+        socket.create_connection((host, port), timeout=1).close()
+        return True
+    except OSError:
+        return False
+
+def edge_exited(process, workdir):
+    """Report a launched edge server that is no longer running, returns True if it exited"""
+    if process is None or process.poll() is None:
+        return False
+    print(f"Edge server exited with code {process.returncode}, see {os.path.join(workdir, 'edge.log')}")
+    return True
+
+def launch_edge(mode, args):
+    """Start edge.py or edge_async.py in a scratch directory, pointed at the stubs.
+
+    Returns (process, log file, scratch directory).
+    """
+    workdir = tempfile.mkdtemp(prefix='edge-loadtest-')
+    env = dict(os.environ)
+    env['MAC_CAMERA_URL'] = f"http://127.0.0.1:{args.camera_port}/snapshot"
+    env['DETECTOR_MODULE_URL'] = f"http://127.0.0.1:{args.detector_port}/image"
+    env['PROCESS_INTERVAL'] = str(args.process_interval)
+    script = os.path.abspath(os.path.join(EDGE_DIR, EDGE_SCRIPTS[mode]))
+    log = open(os.path.join(workdir, 'edge.log'), 'w')
+    print(f"Launching {EDGE_SCRIPTS[mode]} in {workdir}")
+    process = subprocess.Popen([sys.executable, script], cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, log, workdir
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--edge-url', default='http://127.0.0.1:5001')
+    parser.add_argument('--launch-edge', choices=['none', 'sync', 'async'], default='none',
+                        help='start the edge server against the stubs (default: use a running one)')
+    parser.add_argument('--edge-pid', type=int, help='pid to sample memory from when not launching')
+    parser.add_argument('--sse', type=int, default=100, help='number of SSE subscribers')
+    parser.add_argument('--pollers', type=int, default=20, help='number of live-video/history pollers')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='seconds between polls per poller')
+    parser.add_argument('--trigger-interval', type=float, default=5.0,
+                        help='seconds between /api/trigger-processing calls, 0 to disable')
+    parser.add_argument('--duration', type=float, default=60.0)
+    parser.add_argument('--drain', type=float, default=3.0, help='seconds to wait for in-flight events at the end')
+    parser.add_argument('--report-interval', type=float, default=5.0)
+    parser.add_argument('--camera-port', type=int, default=9999)
+    parser.add_argument('--detector-port', type=int, default=9998)
+    parser.add_argument('--camera-latency', type=float, default=0.02, help='mean stub camera latency (s)')
+    parser.add_argument('--detector-latency', type=float, default=0.5, help='mean stub detector latency (s)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of stub requests that fail')
+    parser.add_argument('--process-interval', type=float, default=60, help='PROCESS_INTERVAL for a launched edge')
+    parser.add_argument('--keep-edge-dir', action='store_true',
+                        help="keep a launched edge's scratch directory (edge.log, images, logs)")
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    camera_stats = StubStats()
+    detector_stats = StubStats()
+    start_stub_server(args.camera_port, camera_stats, args.camera_latency, args.failure_rate, create_stub_image())
+    start_stub_server(args.detector_port, detector_stats, args.detector_latency, args.failure_rate)
+    print(f"Stub camera on :{args.camera_port}, stub detector on :{args.detector_port}")
+
+    edge_process = edge_log = edge_workdir = None
+    keep_workdir = args.keep_edge_dir
+    edge_pid = args.edge_pid
+    test = LoadTest(args)
+    if args.launch_edge != 'none':
+        # Otherwise the harness would load-test whatever already listens there
+        if port_in_use(test.host, test.port):
+            print(f"Cannot launch the edge server, {args.edge_url} is already in use")
+            return 1
+        edge_process, edge_log, edge_workdir = launch_edge(args.launch_edge, args)
+        edge_pid = edge_process.pid
+
+    try:
+        if not asyncio.run(wait_for_edge(test.host, test.port, 30, edge_process)):
+            if not edge_exited(edge_process, edge_workdir):
+                print(f"Edge server not reachable at {args.edge_url}")
+            # Keep edge.log for diagnosing the failed start
+            keep_workdir = True
+            return 1
+        asyncio.run(test.run(edge_pid))
+        if edge_exited(edge_process, edge_workdir):
+            keep_workdir = True
+            return 1
+        summary = test.report(detector_stats, camera_stats)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(summary, f, indent=2)
+            print(f"Report written to {args.json}")
+    finally:
+        if edge_process:
+            edge_process.terminate()
+            edge_process.wait(timeout=10)
+            edge_log.close()
+            if keep_workdir:
+                print(f"Edge server output kept in {edge_workdir}")
+            else:
+                shutil.rmtree(edge_workdir, ignore_errors=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
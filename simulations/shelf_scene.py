@@ -0,0 +1,446 @@
+"""Synthetic shelf scenes with exact ground truth.
+
+ShelfScene renders a shelf with the configured zones and items at any
+resolution, and returns each frame together with its ground-truth boxes
+and a detector response in the Custom Vision /image format. Frames can be
+fed to edge.py (CAMERA_SOURCE=simulator) or served by vid.py --simulate, so
+the analysis pipeline can be stress-tested and scored without a camera.
+
+Speed comes from caching rather than drawing fast:
+  * the background (shelves, zone outlines) is drawn once per resolution
+  * each item sprite is drawn once per (type, size)
+  * the composed frame, its ground truth and its JPEG are reused until the
+    scene changes (an event fires or items are edited)
+
+Scripted events change the scene, in order, at a given frame index or time:
+
+    {"frame": 100, "action": "remove", "item": "cup"}
+    {"seconds": 30, "action": "misplace", "item": "bottle", "zone": "cup"}
+    {"frame": 400, "action": "restock"}
+
+Run `python shelf_scene.py --frames 5000` to measure the compose and JPEG
+encode rates of distinct frames (each one re-rolls its random occlusion).
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Mirrors edge.py's EXPECTED_SHELF_ZONES and EXPECTED_INVENTORY
+DEFAULT_ZONES = {
+    'bottle': [{'left': 0.1, 'top': 0.05, 'width': 0.3, 'height': 0.85}],
+    'tea bottle': [{'left': 0.4, 'top': 0.3, 'width': 0.25, 'height': 0.7}],
+    'cup': [{'left': 0.65, 'top': 0.6, 'width': 0.2, 'height': 0.35}],
+}
+DEFAULT_COUNTS = {'bottle': 1, 'tea bottle': 1, 'cup': 2}
+
+# Normalised (width, height) and BGR colour of each item type
+ITEM_STYLES = {
+    'bottle': ((0.06, 0.45), (40, 170, 40)),
+    'tea bottle': ((0.06, 0.35), (30, 90, 200)),
+    'cup': ((0.06, 0.18), (200, 80, 40)),
+}
+DEFAULT_ITEM_STYLE = ((0.06, 0.2), (160, 160, 160))
+
+BACKGROUND_COLOR = (60, 60, 60)
+SHELF_COLOR = (40, 70, 110)
+OCCLUDER_COLOR = (90, 90, 90)
+
+ACTIONS = ('remove', 'misplace', 'restock', 'add')
+
+class SceneFrame:
+    """One rendered frame: pixels, ground truth and matching detector output"""
+    def __init__(self, scene, index, version, image, ground_truth):
+        self.scene = scene
+        self.index = index
+        self.version = version
+        self.image = image
+        self.ground_truth = ground_truth
+
+    @property
+    def jpeg(self):
+        return self.scene.encode(self)
+
+    @property
+    def detector_response(self):
+        return self.scene.detector_response(self)
+
+class ShelfScene:
+    def __init__(self, width=640, height=480, zones=None, counts=None, items=None,
+                 occluders=None, occlusion=0.0, script=None, min_visible=0.3,
+                 jpeg_quality=90, seed=None):
+        """Create a scene.
+
+        zones maps item type to a list of normalised zone rectangles and
+        counts gives how many of each type to place in its zone. items,
+        a list of {'tag', 'left', 'top', 'width', 'height'} dicts, replaces
+        the generated layout. occluders are normalised rectangles drawn over
+        the items; occlusion is the probability of adding a random occluder
+        over each item. Items less visible than min_visible are left out of
+        the detector response.
+        """
+        self.width = width
+        self.height = height
+        self.zones = zones or DEFAULT_ZONES
+        self.counts = dict(counts or DEFAULT_COUNTS)
+        self.min_visible = min_visible
+        self.jpeg_quality = jpeg_quality
+        self.rng = np.random.default_rng(seed)
+
+        self.items = [dict(item) for item in items] if items else self.default_layout()
+        self.occluders = [dict(occluder) for occluder in occluders or []]
+        self.occlusion = occlusion
+        self.random_occluders = []
+        # Events fire in the order given, each once its frame/seconds is reached
+        self.pending = list(script or [])
+        for event in self.pending:
+            self.check_event(event)
+
+        self.lock = threading.Lock()
+        self.frame_index = 0
+        self.started = time.time()
+        self.version = 0
+        self.sprites = {}
+        self.cached = None  # (version, image, ground_truth)
+        self.cached_jpeg = None  # (version, bytes)
+        self.background = self.draw_background()
+        self.reroll_occlusion()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a scene from a JSON-style dict of constructor arguments"""
+        return cls(**config)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls.from_config(json.load(f))
+
+    # Layout
+
+    def slot(self, tag, zone_tag, index, total):
+        """Normalised box for the index-th of total items of tag in zone_tag's zone"""
+        (item_w, item_h), _ = ITEM_STYLES.get(tag, DEFAULT_ITEM_STYLE)
+        zone = self.zones[zone_tag][0]
+        item_w = min(item_w, zone['width'] / max(total, 1))
+        item_h = min(item_h, zone['height'] * 0.9)
+        center = zone['left'] + zone['width'] * (index + 1) / (total + 1)
+        # Stand the item on the shelf at the bottom of the zone
+        return {
+            'tag': tag,
+            'left': center - item_w / 2,
+            'top': zone['top'] + zone['height'] * 0.95 - item_h,
+            'width': item_w,
+            'height': item_h
+        }
+
+    def free_slot(self, tag, zone_tag):
+        """Box for tag in zone_tag's zone, as far as possible from items already there"""
+        zone = self.zones[zone_tag][0]
+        occupied = [
+            item['left'] + item['width'] / 2 for item in self.items
+            if self.zone_of(item) == zone_tag
+        ]
+        # Same size as a lone item, slid along the zone in 8 steps
+        base = self.slot(tag, zone_tag, 0, 1)
+        span = zone['width'] - base['width']
+        candidates = [dict(base, left=zone['left'] + span * i / 7) for i in range(8)]
+        if not occupied:
+            return candidates[len(candidates) // 2]
+        return max(candidates, key=lambda box: min(
+            abs(box['left'] + box['width'] / 2 - center) for center in occupied
+        ))
+
+    def default_layout(self, tags=None):
+        items = []
+        for tag, count in self.counts.items():
+            if tags is not None and tag not in tags:
+                continue
+            if tag not in self.zones:
+                continue
+            items.extend(self.slot(tag, tag, i, count) for i in range(count))
+        return items
+
+    def changed(self):
+        self.version += 1
+        self.reroll_occlusion()
+
+    def reroll_occlusion(self):
+        """Cover a random part of each item with probability self.occlusion"""
+        self.random_occluders = []
+        for item in self.items:
+            if self.occlusion and self.rng.random() < self.occlusion:
+                w = item['width'] * self.rng.uniform(0.3, 1.0)
+                h = item['height'] * self.rng.uniform(0.3, 0.8)
+                self.random_occluders.append({
+                    'left': item['left'] + self.rng.uniform(0, item['width'] - w),
+                    'top': item['top'] + self.rng.uniform(0, item['height'] - h),
+                    'width': w,
+                    'height': h
+                })
+
+    # Events
+
+    def remove(self, tag, count=1):
+        """Take count items of tag off the shelf"""
+        if count < 1:
+            return
+        indexes = [i for i, item in enumerate(self.items) if item['tag'] == tag][-count:]
+        self.items = [item for i, item in enumerate(self.items) if i not in indexes]
+        self.changed()
+
+    def misplace(self, tag, zone, count=1):
+        """Move count items of tag into zone's area"""
+        moved = [item for item in self.items if item['tag'] == tag][:count]
+        for item in moved:
+            # Take the item off the shelf first so it does not block its own slot
+            self.items.remove(item)
+            item.update(self.free_slot(tag, zone))
+            self.items.append(item)
+        self.changed()
+
+    def add(self, tag, zone=None, count=1):
+        """Put count extra items of tag in zone (its own zone by default)"""
+        zone = zone or tag
+        for _ in range(count):
+            self.items.append(self.free_slot(tag, zone))
+        self.changed()
+
+    def restock(self, tag=None):
+        """Reset tag (or every type) to its expected count in its own zone"""
+        tags = [tag] if tag else list(self.counts)
+        self.items = [item for item in self.items if item['tag'] not in tags] + self.default_layout(tags)
+        self.changed()
+
+    def check_event(self, event):
+        """Raise ValueError for an event that cannot be applied to this scene"""
+        action = event.get('action')
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown scene action: {action}")
+        count = event.get('count', 1)
+        if not isinstance(count, int) or count < 1:
+            raise ValueError(f"Scene event count must be a positive integer: {event}")
+        if action != 'restock' and 'item' not in event:
+            raise ValueError(f"Scene event needs an item: {event}")
+        if action == 'misplace' and 'zone' not in event:
+            raise ValueError(f"Scene event needs a zone: {event}")
+        for key in ('item', 'zone'):
+            if event.get(key) is not None and event[key] not in self.zones:
+                raise ValueError(f"Unknown {key} {event[key]!r} in scene event, expected one of: {', '.join(self.zones)}")
+
+    def apply_event(self, event):
+        self.check_event(event)
+        action = event['action']
+        if action == 'remove':
+            self.remove(event['item'], event.get('count', 1))
+        elif action == 'misplace':
+            self.misplace(event['item'], event['zone'], event.get('count', 1))
+        elif action == 'add':
+            self.add(event['item'], event.get('zone'), event.get('count', 1))
+        elif action == 'restock':
+            self.restock(event.get('item'))
+
+    def fire_due_events(self):
+        elapsed = time.time() - self.started
+        while self.pending:
+            event = self.pending[0]
+            if 'frame' in event and self.frame_index < event['frame']:
+                break
+            if 'seconds' in event and elapsed < event['seconds']:
+                break
+            self.pending.pop(0)
+            print(f"Scene event at frame {self.frame_index}: {event}")
+            self.apply_event(event)
+
+    # Drawing
+
+    def pixel_box(self, box):
+        """Pixel (x0, y0, x1, y1) of a normalised box, clipped to the frame"""
+        x0 = int(round(max(box['left'], 0) * self.width))
+        y0 = int(round(max(box['top'], 0) * self.height))
+        x1 = int(round(min(box['left'] + box['width'], 1) * self.width))
+        y1 = int(round(min(box['top'] + box['height'], 1) * self.height))
+        return x0, y0, x1, y1
+
+    def draw_background(self):
+        img = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        img[:] = BACKGROUND_COLOR
+        font_scale = max(self.width / 1600, 0.35)
+        for tag, zones in self.zones.items():
+            for zone in zones:
+                x0, y0, x1, y1 = self.pixel_box(zone)
+                cv2.rectangle(img, (x0, y0), (x1 - 1, y1 - 1), (120, 120, 120), 1)
+                cv2.putText(img, f"{tag} zone", (x0 + 4, y0 + 14), cv2.FONT_HERSHEY_SIMPLEX,
+                            font_scale, (150, 150, 150), 1)
+                # Shelf plank under the zone
+                plank = max(self.height // 80, 2)
+                img[max(y1 - plank, 0):y1, x0:x1] = SHELF_COLOR
+        return img
+
+    def sprite(self, tag, w, h):
+        key = (tag, w, h)
+        if key not in self.sprites:
+            _, color = ITEM_STYLES.get(tag, DEFAULT_ITEM_STYLE)
+            patch = np.empty((h, w, 3), dtype=np.uint8)
+            patch[:] = color
+            border = max(min(w, h) // 20, 1)
+            patch[:border] = patch[-border:] = patch[:, :border] = patch[:, -border:] = (255, 255, 255)
+            if w > 20 and h > 12:
+                cv2.putText(patch, tag[:8].upper(), (2, min(h - 2, 14)), cv2.FONT_HERSHEY_SIMPLEX,
+                            0.3, (255, 255, 255), 1)
+            self.sprites[key] = patch
+        return self.sprites[key]
+
+    def zone_of(self, box):
+        """Item type whose zone contains the centre of box, or None"""
+        cx = box['left'] + box['width'] / 2
+        cy = box['top'] + box['height'] / 2
+        for tag, zones in self.zones.items():
+            for zone in zones:
+                if zone['left'] <= cx <= zone['left'] + zone['width'] and zone['top'] <= cy <= zone['top'] + zone['height']:
+                    return tag
+        return None
+
+    def compose(self):
+        """Draw items and occluders, returns (image, ground_truth)"""
+        img = self.background.copy()
+        boxes = [self.pixel_box(item) for item in self.items]
+        occluder_boxes = [self.pixel_box(occluder) for occluder in self.occluders + self.random_occluders]
+
+        for item, (x0, y0, x1, y1) in zip(self.items, boxes):
+            if x1 <= x0 or y1 <= y0:
+                continue
+            img[y0:y1, x0:x1] = self.sprite(item['tag'], x1 - x0, y1 - y0)
+
+        for x0, y0, x1, y1 in occluder_boxes:
+            img[y0:y1, x0:x1] = OCCLUDER_COLOR
+
+        ground_truth = []
+        for index, (item, box) in enumerate(zip(self.items, boxes)):
+            x0, y0, x1, y1 = box
+            if x1 <= x0 or y1 <= y0:
+                continue
+            # Items drawn later and occluders cover this one
+            visible = self.visible_fraction(box, boxes[index + 1:] + occluder_boxes)
+            ground_truth.append({
+                'tagName': item['tag'],
+                'boundingBox': {
+                    'left': x0 / self.width,
+                    'top': y0 / self.height,
+                    'width': (x1 - x0) / self.width,
+                    'height': (y1 - y0) / self.height
+                },
+                'visible_fraction': round(visible, 4),
+                'zone': self.zone_of(item)
+            })
+        return img, ground_truth
+
+    @staticmethod
+    def visible_fraction(box, covers):
+        """Fraction of box not covered by any of the covers, using a box-sized mask"""
+        x0, y0, x1, y1 = box
+        overlapping = [
+            (max(cx0, x0) - x0, max(cy0, y0) - y0, min(cx1, x1) - x0, min(cy1, y1) - y0)
+            for cx0, cy0, cx1, cy1 in covers
+            if cx0 < x1 and cx1 > x0 and cy0 < y1 and cy1 > y0
+        ]
+        if not overlapping:
+            return 1.0
+        mask = np.ones((y1 - y0, x1 - x0), dtype=bool)
+        for cx0, cy0, cx1, cy1 in overlapping:
+            mask[cy0:cy1, cx0:cx1] = False
+        return np.count_nonzero(mask) / mask.size
+
+    def render(self):
+        """Advance one frame and return it as a SceneFrame"""
+        with self.lock:
+            self.fire_due_events()
+            if self.cached is None or self.cached[0] != self.version:
+                image, ground_truth = self.compose()
+                self.cached = (self.version, image, ground_truth)
+            version, image, ground_truth = self.cached
+            frame = SceneFrame(self, self.frame_index, version, image, ground_truth)
+            self.frame_index += 1
+            return frame
+
+    def encode(self, frame):
+        """JPEG bytes of a frame, encoded once per scene version"""
+        with self.lock:
+            if self.cached_jpeg is not None and self.cached_jpeg[0] == frame.version:
+                return self.cached_jpeg[1]
+        ret, jpeg = cv2.imencode('.jpg', frame.image, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        if not ret:
+            raise RuntimeError("Failed to encode scene frame")
+        data = jpeg.tobytes()
+        with self.lock:
+            self.cached_jpeg = (frame.version, data)
+        return data
+
+    def detector_response(self, frame):
+        """What a perfect detector would return for frame, in /image format"""
+        predictions = []
+        for index, truth in enumerate(frame.ground_truth):
+            if truth['visible_fraction'] < self.min_visible:
+                continue
+            predictions.append({
+                # Confidence drops with occlusion, as a real model's would
+                'probability': round(0.6 + 0.39 * truth['visible_fraction'], 6),
+                'tagId': index,
+                'tagName': truth['tagName'],
+                'boundingBox': dict(truth['boundingBox'])
+            })
+        return {
+            'id': f"sim-{frame.index}",
+            'project': 'shelf-scene',
+            'iteration': 'ground-truth',
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'predictions': predictions
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Render synthetic shelf frames and report throughput")
+    parser.add_argument('--config', help='JSON file of ShelfScene arguments')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--frames', type=int, default=1000)
+    parser.add_argument('--occlusion', type=float,
+                        help="chance of a random occluder per item, re-rolled every frame (default: the config's, else 0.3)")
+    parser.add_argument('--output', help='directory to write the last frame and its ground truth to')
+    args = parser.parse_args()
+
+    if args.config:
+        scene = ShelfScene.from_file(args.config)
+    else:
+        scene = ShelfScene(width=args.width, height=args.height, occlusion=0.3)
+    if args.occlusion is not None:
+        scene.occlusion = args.occlusion
+
+    compose_time = encode_time = 0.0
+    for _ in range(args.frames):
+        # A new scene version per frame, so no frame is served from the cache
+        scene.changed()
+        started = time.perf_counter()
+        frame = scene.render()
+        composed = time.perf_counter()
+        frame.jpeg
+        compose_time += composed - started
+        encode_time += time.perf_counter() - composed
+    print(f"{args.frames} distinct frames at {scene.width}x{scene.height}: "
+          f"compose {args.frames / compose_time:.0f} frames/s, "
+          f"JPEG encode {args.frames / encode_time:.0f} frames/s, "
+          f"both {args.frames / (compose_time + encode_time):.0f} frames/s")
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        with open(os.path.join(args.output, f"frame_{frame.index:06d}.jpg"), 'wb') as f:
+            f.write(frame.jpeg)
+        with open(os.path.join(args.output, f"frame_{frame.index:06d}.json"), 'w') as f:
+            json.dump({'ground_truth': frame.ground_truth, 'detector_response': frame.detector_response}, f, indent=2)
+        print(f"Last frame written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,13 @@
-from flask import Flask, Response
+from flask import Flask, Response, request, jsonify
 import cv2
 import threading
+import argparse
+import hashlib
+from collections import OrderedDict
 from flask_cors import CORS  # Import the CORS module
 
+from shelf_scene import ShelfScene
+
 app = Flask(__name__)
 # Enable CORS for all routes, or specify origins
 CORS(app, origins=["http://localhost:3001"])
@@ -37,11 +42,50 @@ class Camera:
         self.thread.join()
         self.camera.release()
 
-camera = Camera()
+class SimulatedCamera:
+    """Serves synthetic shelf frames instead of a real camera"""
+    def __init__(self, scene):
+        self.scene = scene
+        self.last_frame = None
+        # Detector responses of recently served JPEGs, so /image answers for
+        # exactly the frame the client captured
+        self.responses = OrderedDict()
+        self.lock = threading.Lock()
+        print(f"Scene simulator initialized at {scene.width}x{scene.height}")
+
+    def get_frame(self):
+        frame = self.scene.render()
+        jpeg = frame.jpeg
+        with self.lock:
+            self.last_frame = frame
+            digest = hashlib.sha1(jpeg).digest()
+            if digest not in self.responses:
+                self.responses[digest] = frame.detector_response
+                while len(self.responses) > 16:
+                    self.responses.popitem(last=False)
+        return jpeg
+
+    def detector_response(self, jpeg):
+        """Ground truth of a recently served JPEG, None for any other image"""
+        with self.lock:
+            return self.responses.get(hashlib.sha1(jpeg).digest())
+
+    def release(self):
+        pass
+
+camera = None  # Set by __main__, otherwise the real camera is opened on first use
+camera_lock = threading.Lock()
+
+def get_camera():
+    global camera
+    with camera_lock:
+        if camera is None:
+            camera = Camera()
+        return camera
 
 def generate_frames():
     while True:
-        frame = camera.get_frame()
+        frame = get_camera().get_frame()
         if frame:
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
@@ -50,6 +94,29 @@ def generate_frames():
 def index():
     return "Mac Camera Stream Server - Use /video_feed for stream or /snapshot for images"
 
+@app.route('/ground_truth')
+def ground_truth():
+    """Ground truth of the last simulated frame (--simulate only)"""
+    if not isinstance(camera, SimulatedCamera):
+        return "Ground truth is only available with --simulate", 404
+    frame = camera.last_frame or camera.scene.render()
+    return jsonify({
+        'frame': frame.index,
+        'ground_truth': frame.ground_truth,
+        'detector_response': frame.detector_response
+    })
+
+@app.route('/image', methods=['POST'])
+def detect():
+    """Stub detector returning the simulated frame's ground truth (--simulate only)"""
+    if not isinstance(camera, SimulatedCamera):
+        return "Stub detector is only available with --simulate", 404
+    response = camera.detector_response(request.get_data())
+    if response is None:
+        # Answering with another frame's ground truth would make scoring meaningless
+        return jsonify({'error': 'Image is not a recently served simulator frame'}), 404
+    return jsonify(response)
+
 @app.route('/video_feed')
 def video_feed():
     return Response(generate_frames(),
@@ -57,16 +124,33 @@ def video_feed():
 
 @app.route('/snapshot')
 def snapshot():
-    frame = camera.get_frame()
+    frame = get_camera().get_frame()
     if frame:
         return Response(frame, mimetype='image/jpeg')
     return "No frame available", 500
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mac camera stream server")
+    parser.add_argument('--simulate', action='store_true', help='serve synthetic shelf scenes instead of the camera')
+    parser.add_argument('--scene', help='JSON file of ShelfScene arguments (implies --simulate)')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    args = parser.parse_args()
+
+    if args.scene:
+        camera = SimulatedCamera(ShelfScene.from_file(args.scene))
+    elif args.simulate:
+        camera = SimulatedCamera(ShelfScene(width=args.width, height=args.height))
+    else:
+        camera = Camera()
+
     print("=== Mac Camera Stream Server ===")
     print("Running on port 5002")
     print("Stream endpoint: http://localhost:5002/video_feed")
     print("Snapshot endpoint: http://localhost:5002/snapshot")
+    if isinstance(camera, SimulatedCamera):
+        print("Ground truth endpoint: http://localhost:5002/ground_truth")
+        print("Stub detector endpoint: http://localhost:5002/image")
     print("\nTo expose to VM, run this SSH tunnel:")
     print("ssh -R 9999:localhost:5002 aicha19@4.234.141.39")
     print("\nThen VM can access: http://localhost:9999/snapshot")
@@ -74,4 +158,5 @@ if __name__ == '__main__':
     try:
         app.run(host='0.0.0.0', port=5002, debug=False)
     finally:
-        camera.release()
\ No newline at end of file
+        if camera is not None:
+            camera.release()
\ No newline at end of file